@@ -1,230 +1,369 @@
-from blinkit import extract_image_urls_from_url, modify_image_url, open_image_from_url
-import google.generativeai as genai
+from blinkit import extract_prid, fetch_images, scrape_product
+import hashlib
 import os
-from dotenv import load_dotenv
 import json
+import logging
+from io import BytesIO
 from prompts import analyze_food_prompt, extract_ingredients_and_nutrition_prompt
 from flask import jsonify
 import PIL.Image
-import pandas as pd
-from googli import analyze_google_sync
-from mistralai import Mistral
+from reference_data import reference_store
+from safety_index import build_safety_index
+from googli import analyze_google_sync, prefetch_search
+from llm_clients import GEMINI_MODEL, MISTRAL_MODEL, llm_clients
+from cache import CACHE_DIR, SqliteCache
+from image_prep import ImagePrepConfig, prepare_images
+from pipeline import Stage, run_stages
+from nutrition import nutrition_summary
+from context_builder import build_analysis_context
+from incremental_json import IngredientStreamParser
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Changing a prompt or model changes the version, so stale analyses are never served
+PROMPT_VERSION = hashlib.sha256(
+    "\0".join([extract_ingredients_and_nutrition_prompt, analyze_food_prompt, GEMINI_MODEL, MISTRAL_MODEL]).encode()
+).hexdigest()[:16]
+
+# Final URL analysis payloads keyed by Blinkit product id
+product_cache = SqliteCache(
+    os.getenv("PRODUCT_CACHE_PATH", os.path.join(CACHE_DIR, "products.sqlite3")),
+    ttl=int(os.getenv("PRODUCT_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "5000")),
+)
+
+# How label images are resized/re-encoded before the Gemini call
+image_prep_config = ImagePrepConfig.from_env()
+
+# Gemini extraction results keyed by the content of the label images
+extraction_cache = SqliteCache(
+    os.getenv("EXTRACTION_CACHE_PATH", os.path.join(CACHE_DIR, "extractions.sqlite3")),
+    ttl=int(os.getenv("EXTRACTION_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "20000")),
+)
+
+def product_cache_key(prid):
+    return f"{prid}:{PROMPT_VERSION}"
+
+def invalidate_product_cache(url_or_prid):
+    """Drop every cached analysis of a product, for all prompt versions"""
+    prid = extract_prid(url_or_prid) or url_or_prid
+    product_cache.invalidate_prefix(f"{prid}:")
+
+def image_digest(image):
+    """Hash an image's decoded pixels, so re-encodes of the same file hash the same"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def extraction_cache_key(images):
+    """Key for an image set: the prompt/model/image-prep version plus the sorted image digests"""
+    digests = sorted(image_digest(image) for image in images)
+    return hashlib.sha256(
+        "\0".join([extract_ingredients_and_nutrition_prompt, GEMINI_MODEL, repr(image_prep_config)] + digests).encode()
+    ).hexdigest()
+
+def extract_label_data(images, on_ingredient=None):
+    """
+    Extract ingredients and the nutrition label from images, reusing earlier
+    results for the same images. The response is streamed, and
+    ``on_ingredient(ingredient)`` is called for each ingredient as soon as
+    Gemini has finished writing it.
+    """
+    images = list(images)
+    if not images:
+        # Gemini would answer from the prompt alone, and the key of an empty
+        # image set is the same for every product
+        raise ValueError("No label images to extract from")
+    cache_key = extraction_cache_key(images)
+    extracted_data = extraction_cache.get(cache_key)
+    if extracted_data is not None:
+        logger.info("Using cached extraction for these images")
+        return extracted_data
+
+    image_blobs = prepare_images(images, image_prep_config)
+    parser = IngredientStreamParser()
+    for text in llm_clients.stream_content([extract_ingredients_and_nutrition_prompt] + image_blobs):
+        for ingredient in parser.feed(text):
+            if on_ingredient is not None:
+                on_ingredient(ingredient)
+    logger.debug("Raw extraction response: %s", parser.text)
+    extracted_data = parser.result()
+    extraction_cache.set(cache_key, extracted_data)
+    return extracted_data
 
 def load_reference_data():
-    """Load and prepare reference data from CSV files"""
+    """Return the shared reference tables, parsing the CSVs only on first use or after they change"""
     try:
-        # Load CSV files
-        scogs_df = pd.read_csv('data/FDA--SCOGS.csv')
-        monographs_df = pd.read_csv('data/monographs.csv')
-        roc_df = pd.read_csv('data/roc15_casrn_index.csv')
-        fda_substances_df = pd.read_csv('data/FDA--FoodSubstances.csv')
-
-        return {
-            'scogs': scogs_df,
-            'monographs': monographs_df,
-            'roc': roc_df,
-            'fda_substances': fda_substances_df
-        }
+        return reference_store.get()
     except Exception as e:
-        print(f"Error loading reference data: {e}")
+        logger.warning("Error loading reference data: %s", e)
         return None
 
 def lookup_ingredient_safety(ingredient_name, cas_number, reference_data):
     """Look up safety information for an ingredient across reference databases"""
-    safety_info = []
-
-    # Check SCOGS database
-    scogs_match = reference_data['scogs'][
-        (reference_data['scogs']['GRAS Substance'].str.contains(ingredient_name, case=False, na=False)) |
-        (reference_data['scogs']['CAS Reg. No. or other ID CODE'] == cas_number)
+    safety_index = reference_data.get('safety_index') or build_safety_index(reference_data)
+    return safety_index.lookup(ingredient_name, cas_number)
+
+def lookup_ingredients_safety(ingredients, reference_data):
+    """Look up safety information for a whole ingredient list in a single call"""
+    safety_index = reference_data.get('safety_index') or build_safety_index(reference_data)
+    return safety_index.lookup_many(ingredients)
+
+# Stage name -> (response field, value taken from the stage result), used to
+# stream each part of the response as soon as the stage producing it finishes
+PARTIAL_RESULTS = {
+    "scrape": ("product_name", lambda scrape: scrape.product_name),
+    "extract": ("extracted_data", lambda extracted_data: extracted_data),
+    "nutrition": ("nutrition_summary", lambda summary: summary),
+    "safety": ("safety_classifications", lambda safety: safety),
+    "search": ("ingredient_search_results", lambda search_results: search_results),
+    "analysis": ("analysis", lambda analysis: analysis),
+}
+
+def partial_result(stage, result):
+    """Return (field, value) for a stage whose result is part of the response, else None"""
+    if stage not in PARTIAL_RESULTS:
+        return None
+    field, value = PARTIAL_RESULTS[stage]
+    return field, value(result)
+
+def _reference_data_stage(results):
+    logger.debug("Loading reference data...")
+    reference_data = load_reference_data()
+    if not reference_data:
+        raise Exception("Failed to load reference data")
+    return reference_data
+
+def _nutrition_stage(results):
+    logger.debug("Scoring nutrition label...")
+    summary = nutrition_summary(results["extract"].get("nutritional label") or {})
+    metrics.add(items=len(summary["nutrients"]))
+    return summary
+
+def _safety_stage(results):
+    logger.debug("Looking up ingredient safety information...")
+    metrics.add(items=len(results["extract"]["ingredients"]))
+    return lookup_ingredients_safety(results["extract"]["ingredients"], results["reference_data"])
+
+def _search_stage(results):
+    logger.debug("Adding Google search results for ingredients...")
+    metrics.add(items=len(results["extract"]["ingredients"]))
+    return analyze_google_sync(results["extract"]["ingredients"])
+
+def _degraded(results):
+    """
+    Why a URL analysis is incomplete, or None: some carousel images failed
+    to download, or some ingredient searches did not finish.
+    """
+    expected = len(dict.fromkeys(results["scrape"].image_urls))
+    if len(results["images"]) < expected:
+        return f"{expected - len(results['images'])} of {expected} images failed to download"
+    missing = getattr(results["search"], "missing", ())
+    if missing:
+        return f"{len(missing)} ingredient search(es) did not finish"
+    return None
+
+def _combined_data(results):
+    extracted_data = dict(results["extract"])
+    extracted_data["nutrition_summary"] = results["nutrition"]
+    extracted_data["safety_classifications"] = results["safety"]
+    extracted_data["ingredient_search_results"] = results["search"]
+    return extracted_data
+
+def _context_stage(results):
+    logger.debug("Building analysis prompt...")
+    payload, stats = build_analysis_context(_combined_data(results), system_prompt=analyze_food_prompt)
+    logger.info("Prompt size: ~%d tokens, %d/%d search results", stats["estimated_tokens"],
+                stats["search_results_included"], stats["search_results_available"])
+    metrics.add(items=stats["search_results_included"], bytes=len(payload.encode()))
+    return {"payload": payload, "stats": stats}
+
+def _analysis_stage(results):
+    logger.debug("Analyzing nutritional data...")
+    analysis_messages = [
+        {"role": "system", "content": analyze_food_prompt},
+        {"role": "user", "content": f"Analyze this product data:\n{results['context']['payload']}"}
     ]
-    if not scogs_match.empty:
-        safety_info.append(f"FDA SCOGS Status: {scogs_match.iloc[0]['SCOGS Type of Conclusion']}")
 
-    # Check IARC Monographs
-    monographs_match = reference_data['monographs'][
-        (reference_data['monographs']['Agent'].str.contains(ingredient_name, case=False, na=False)) |
-        (reference_data['monographs']['CAS No.'] == cas_number)
+    analysis_response = llm_clients.chat_complete(
+        model=MISTRAL_MODEL,
+        messages=analysis_messages,
+        response_format={"type": "json_object"}
+    )
+    analysis_text = analysis_response.choices[0].message.content
+    return json.loads(analysis_text.strip().strip("```json").strip())
+
+def _log_extracted(extracted_data):
+    metrics.add(items=len(extracted_data["ingredients"]))
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if "product_name" in extracted_data:
+        logger.debug("Product: %s", extracted_data["product_name"])
+    logger.debug("Ingredients: %s", extracted_data["ingredients"])
+    logger.debug("Nutrition: %s", extracted_data["nutritional label"])
+
+def analysis_stages(*source_stages):
+    """
+    The stages shared by both pipelines. ``source_stages`` must end in an
+    "extract" stage that returns the extracted ingredients/nutrition dict;
+    nutrition scoring, safety lookup and Google search only need that, so
+    they run side by side, while reference data loads during
+    scraping/extraction.
+    """
+    return [
+        Stage("reference_data", _reference_data_stage, []),
+        *source_stages,
+        Stage("nutrition", _nutrition_stage, ["extract"]),
+        Stage("safety", _safety_stage, ["extract", "reference_data"]),
+        Stage("search", _search_stage, ["extract"]),
+        Stage("context", _context_stage, ["extract", "nutrition", "safety", "search"]),
+        Stage("analysis", _analysis_stage, ["context"]),
     ]
-    if not monographs_match.empty:
-        safety_info.append(f"IARC Classification: Group {monographs_match.iloc[0]['Group']}")
 
-    # Check ROC listing
-    roc_match = reference_data['roc'][
-        (reference_data['roc']['NAME OR SYNONYM'].str.contains(ingredient_name, case=False, na=False)) |
-        (reference_data['roc']['CASRN'] == cas_number)
-    ]
-    if not roc_match.empty:
-        safety_info.append(f"Report on Carcinogens Status: {roc_match.iloc[0]['Listing in the 15th RoC']}")
+def open_label_image(source):
+    """
+    Decode a label image from a path, raw bytes or a binary file-like object.
+    The pixels are loaded right away, so the source can be closed afterwards.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    image = PIL.Image.open(source)
+    image.load()
+    return image
+
+def analyze_product_image(image, on_stage=None):
+    """
+    Analyze a label image, given as a path, raw bytes or a binary file-like
+    object. ``on_stage(name, result)`` is called as each pipeline stage
+    finishes.
+    """
+    try:
+        logger.info("Starting image analysis")
 
-    return safety_info if safety_info else ["No safety classification found in reference databases"]
+        def open_image(results):
+            logger.debug("Processing image...")
+            if isinstance(image, (bytes, bytearray, memoryview)):
+                metrics.add(items=1, bytes=len(image))
+            return open_label_image(image)
 
-def analyze_product_image(image_path):
-    try:
-        print("\n=== Starting Image Analysis ===")
-
-        # Setup both APIs
-        print("\n1. Configuring APIs...")
-        load_dotenv()
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY_2"))
-        gemini_model = genai.GenerativeModel("gemini-1.5-pro")
-        mistral_client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
-
-        # Load reference data
-        reference_data = load_reference_data()
-        if not reference_data:
-            raise Exception("Failed to load reference data")
-
-        # Load and process image
-        print("\n2. Processing image...")
-        image = PIL.Image.open(image_path)
-
-        # Extract ingredients and nutrition data
-        print("\n3. Extracting ingredients and nutrition data...")
-        extraction_response = gemini_model.generate_content([extract_ingredients_and_nutrition_prompt, image])
-        print("Raw extraction response:", extraction_response.text)
-
-        extracted_data = json.loads(extraction_response.text.strip().strip("```json").strip())
-        print("\nExtracted Data:")
-        print("Ingredients:", extracted_data["ingredients"])
-        print("Nutrition:", extracted_data["nutritional label"])
-
-        # After extracting ingredients, look up safety information
-        print("\n4. Looking up ingredient safety information...")
-        safety_data = {}
-        for ingredient in extracted_data["ingredients"]:
-            safety_info = lookup_ingredient_safety(ingredient, None, reference_data)
-            safety_data[ingredient] = safety_info
-        extracted_data["safety_classifications"] = safety_data
-
-        # Add Google search results for ingredients
-        print("\n5. Adding Google search results for ingredients...")
-        google_results = analyze_google_sync(extracted_data["ingredients"])
-        extracted_data["ingredient_search_results"] = google_results
-
-        # Analyze the data
-        print("\n6. Analyzing nutritional data...")
-        analysis_messages = [
-            {"role": "system", "content": analyze_food_prompt},
-            {"role": "user", "content": f"Analyze this product data:\n{json.dumps(extracted_data)}"}
-        ]
-
-        analysis_response = mistral_client.chat.complete(
-            model="mistral-large-latest",
-            messages=analysis_messages,
-            response_format={"type": "json_object"}
-        )
-        analysis_text = analysis_response.choices[0].message.content
-        analysis_response_cleaned = json.loads(analysis_text.strip().strip("```json").strip())
-
-        print("\n=== Analysis Results ===")
-        print(analysis_response_cleaned)
+        def extract(results):
+            logger.debug("Extracting ingredients and nutrition data...")
+            extracted_data = extract_label_data([results["image"]], on_ingredient=prefetch_search)
+            _log_extracted(extracted_data)
+            return extracted_data
+
+        results, timings = run_stages(analysis_stages(
+            Stage("image", open_image, []),
+            Stage("extract", extract, ["image"]),
+        ), on_stage=on_stage)
+
+        logger.debug("Analysis results: %s", results["analysis"])
 
         return {
             "success": True,
             "data": {
-                "extracted_data": extracted_data,
-                "analysis": analysis_response_cleaned
+                "extracted_data": _combined_data(results),
+                "analysis": results["analysis"],
+                "prompt": results["context"]["stats"],
+                "timings": timings
             }
         }
     except Exception as e:
+        logger.warning("Image analysis failed: %s", e)
         return {
             "success": False,
             "error": str(e)
         }
 
 # Update the original analyze_product function to handle both URLs and images
-def analyze_product(source, is_url=True):
+def analyze_product(source, is_url=True, scrape=None, use_cache=True, on_stage=None):
     if is_url:
         # Existing URL analysis code
-        return analyze_product_url(source)
+        return analyze_product_url(source, scrape=scrape, use_cache=use_cache, on_stage=on_stage)
     else:
         # New image analysis code
-        return analyze_product_image(source)
+        return analyze_product_image(source, on_stage=on_stage)
 
 # Rename the original function to be more specific
-def analyze_product_url(url):
+def analyze_product_url(url, scrape=None, use_cache=True, on_stage=None):
+    """
+    Analyze a Blinkit product page. Pass ``scrape`` (a blinkit.ScrapeContext)
+    when the page has already been scraped for this request so it is not
+    loaded a second time. Results for /prid/ URLs are served from and stored
+    in ``product_cache`` unless ``use_cache`` is False; results missing
+    images or search results are not stored. ``on_stage(name,
+    result)`` is called as each pipeline stage finishes.
+    """
     try:
-        print("\n=== Starting Product Analysis ===")
-
-        # Setup APIs
-        print("\n1. Configuring APIs...")
-        load_dotenv()
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY_2"))
-        gemini_model = genai.GenerativeModel("gemini-1.5-pro")
-        mistral_client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
-
-        # Load reference data
-        print("\n2. Loading reference data...")
-        reference_data = load_reference_data()
-        if not reference_data:
-            raise Exception("Failed to load reference data")
-
-        # Extract images and product info
-        print("\n3. Extracting images from URL...")
-        product_name, image_urls = extract_image_urls_from_url(url)
-
-        # Process images
-        print("\n4. Processing images...")
-        image_list = [
-            open_image_from_url(image_url)
-            for image_url in image_urls
-            if open_image_from_url(image_url) is not None
-        ]
-
-        print("\n5. Extracting ingredients and nutrition data...")
-        extraction_response = gemini_model.generate_content([extract_ingredients_and_nutrition_prompt] + image_list)
-        extracted_data = json.loads(extraction_response.text.strip().strip("```json").strip())
-        extracted_data["product_name"] = product_name
-        print("\nExtracted Data:")
-        print("Product:", extracted_data["product_name"])
-        print("Ingredients:", extracted_data["ingredients"])
-        print("Nutrition:", extracted_data["nutritional label"])
-
-        # Look up safety information
-        print("\n6. Looking up ingredient safety information...")
-        safety_data = {}
-        for ingredient in extracted_data["ingredients"]:
-            safety_info = lookup_ingredient_safety(ingredient, None, reference_data)
-            safety_data[ingredient] = safety_info
-        extracted_data["safety_classifications"] = safety_data
-
-        # Add Google search results for ingredients
-        print("\n7. Adding Google search results for ingredients...")
-        google_results = analyze_google_sync(extracted_data["ingredients"])
-        extracted_data["ingredient_search_results"] = google_results
-
-        # Analyze the data
-        print("\n8. Analyzing nutritional data...")
-        analysis_messages = [
-            {"role": "system", "content": analyze_food_prompt},
-            {"role": "user", "content": f"Analyze this product data:\n{json.dumps(extracted_data)}"}
-        ]
-
-        analysis_response = mistral_client.chat.complete(
-            model="mistral-large-latest",
-            messages=analysis_messages,
-            response_format={"type": "json_object"}
-        )
-        analysis_text = analysis_response.choices[0].message.content
-        analysis_response_cleaned = json.loads(analysis_text.strip().strip("```json").strip())
-
-        print("\n=== Analysis Results ===")
-        print(analysis_response_cleaned)
-
+        logger.info("Starting product analysis for %s", url)
+
+        prid = extract_prid(url)
+        cache_key = product_cache_key(prid) if prid and use_cache else None
+        if cache_key:
+            cached = product_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving cached analysis for product %s", prid)
+                cached["cached"] = True
+                return {
+                    "success": True,
+                    "data": cached
+                }
+
+        def scrape_stage(results):
+            if scrape is not None:
+                return scrape
+            logger.debug("Extracting images from URL...")
+            return scrape_product(url)
+
+        def images_stage(results):
+            logger.debug("Processing images...")
+            return fetch_images(results["scrape"].image_urls)
+
+        def extract(results):
+            logger.debug("Extracting ingredients and nutrition data...")
+            extracted_data = extract_label_data(results["images"], on_ingredient=prefetch_search)
+            extracted_data["product_name"] = results["scrape"].product_name
+            _log_extracted(extracted_data)
+            return extracted_data
+
+        results, timings = run_stages(analysis_stages(
+            Stage("scrape", scrape_stage, []),
+            Stage("images", images_stage, ["scrape"]),
+            Stage("extract", extract, ["images"]),
+        ), on_stage=on_stage)
+
+        logger.debug("Analysis results: %s", results["analysis"])
+
+        data = {
+            "product_name": results["scrape"].product_name,
+            "extracted_data": _combined_data(results),
+            "analysis": results["analysis"]
+        }
+        if cache_key:
+            degraded = _degraded(results)
+            if degraded:
+                # Served this once, but not kept: the next request gets a full retry
+                logger.info("Not caching analysis for product %s: %s", prid, degraded)
+            else:
+                product_cache.set(cache_key, data)
+
+        data["scrape_source"] = results["scrape"].source
+        data["prompt"] = results["context"]["stats"]
+        data["timings"] = timings
         return {
             "success": True,
-            "data": {
-                "extracted_data": extracted_data,
-                "analysis": analysis_response_cleaned
-            }
+            "data": data
         }
     except Exception as e:
+        logger.warning("Product analysis failed for %s: %s", url, e)
         return {
             "success": False,
             "error": str(e)
         }
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "DEBUG"))
     url = "https://blinkit.com/prn/cadbury-gems-duo-pack-chocolate/prid/110655"
     analyze_product(url)
\ No newline at end of file
@@ -1,11 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from analyze import analyze_product
+from analyze import analyze_product, partial_result
+import hashlib
+import json
+import logging
 import os
-from werkzeug.utils import secure_filename
-from blinkit import extract_image_urls_from_url
+from io import BytesIO
+from blinkit import extract_prid
+from jobs import JobManager, JobQueueFull
+from reference_data import reference_store
+import metrics
+
+# LOG_LEVEL=DEBUG brings back the step-by-step pipeline output
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+class InMemoryUploadRequest(Request):
+    """Keeps uploaded files in memory instead of spooling large ones to a temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
+
+# Parse the reference CSVs before taking traffic instead of on the first request
+reference_store.warm()
 
 # Update CORS configuration
 CORS(app, resources={
@@ -40,17 +62,101 @@ def after_request(response):
         response.headers.add('Access-Control-Max-Age', '3600')
     return response
 
-# Configure upload settings
-UPLOAD_FOLDER = 'uploads'
+# Configure upload settings; larger requests are rejected with 413 before the body is read
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "16"))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
-# Create uploads directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        "success": False,
+        "error": f"File too large (limit is {MAX_UPLOAD_MB} MB)"
+    }), 413
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Background analyses for async (submit-and-poll) and streaming requests
+job_manager = JobManager(
+    workers=int(os.getenv("ANALYSIS_WORKERS", "4")),
+    max_queued=int(os.getenv("ANALYSIS_QUEUE_LIMIT", "100")),
+    retention=int(os.getenv("ANALYSIS_JOB_RETENTION", "3600")),
+)
+
+def request_flag(name, data=None):
+    """A mode flag given as ?name=1, "name": true in the JSON body or a form field"""
+    flag = request.args.get(name) or request.form.get(name) or (data or {}).get(name)
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def start_job(key, source, is_url):
+    """Queue an analysis whose stages and partial results are recorded as job events"""
+    def on_stage(job, stage, result):
+        job.add_event("stage", stage=stage)
+        partial = partial_result(stage, result)
+        if partial:
+            job.add_event("partial", key=partial[0], value=partial[1])
+
+    def run(job):
+        return analyze_product(
+            source,
+            is_url=is_url,
+            on_stage=lambda stage, result: on_stage(job, stage, result)
+        )
+
+    return job_manager.submit(key, run)
+
+def job_event_stream(job):
+    """Yield a job's events as they happen, then its final "done"/"failed" event with the result"""
+    sent = 0
+    while True:
+        events = job.wait_for_events(sent)
+        for event in events:
+            if event["event"] in ("done", "failed"):
+                event = {**event, "result": job.result}
+            yield event
+        sent += len(events)
+        if job.finished and sent >= len(job.events):
+            return
+        if not events:
+            yield None  # nothing new; lets callers send a keep-alive
+
+def analysis_response(key, source, is_url, data=None):
+    """
+    Run an analysis in one of three modes: streamed as NDJSON (stream flag),
+    submitted for polling (async flag), or answered in one response.
+    """
+    stream = request_flag('stream', data)
+    if not stream and not request_flag('async', data):
+        return jsonify(analyze_product(source, is_url=is_url))
+
+    try:
+        job = start_job(key, source, is_url)
+    except JobQueueFull as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 503
+
+    if stream:
+        def ndjson():
+            for event in job_event_stream(job):
+                yield "\n" if event is None else json.dumps(event) + "\n"
+
+        return Response(
+            stream_with_context(ndjson()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }), 202
+
 @app.route('/api/analyze', methods=['POST', 'OPTIONS'])
 def analyze():
     if request.method == 'OPTIONS':
@@ -66,14 +172,8 @@ def analyze():
                 "error": "URL is required"
             }), 400
 
-        # Get product name and image URLs
-        product_name, image_urls = extract_image_urls_from_url(data['url'])
-        result = analyze_product(data['url'], is_url=True)
-
-        if result["success"]:
-            result["data"]["product_name"] = product_name
-
-        return jsonify(result)
+        # The pipeline scrapes the page once and returns the product name in result["data"]
+        return analysis_response(f"url:{extract_prid(data['url']) or data['url']}", data['url'], True, data)
 
     # Handle image upload analysis
     if 'image' not in request.files:
@@ -90,27 +190,58 @@ def analyze():
         }), 400
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        # Analyze the uploaded image
-        result = analyze_product(filepath, is_url=False)
-
-        # Clean up uploaded file
-        os.remove(filepath)
-
-        return jsonify(result)
+        # The upload is decoded straight from memory; nothing touches the disk
+        image_bytes = file.read()
+        return analysis_response(f"image:{hashlib.sha256(image_bytes).hexdigest()}", image_bytes, False)
 
     return jsonify({
         "success": False,
         "error": "Invalid file type"
     }), 400
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown job"
+        }), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: "stage" and "partial" events as stages finish, then "done" or "failed" with the result"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown job"
+        }), 404
+
+    def stream():
+        for event in job_event_stream(job):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                payload = event["result"] if "result" in event else event
+                yield f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy"})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage, provider and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
 
@@ -0,0 +1,323 @@
+"""
+Offline batch analysis of many products, without the web server.
+
+    python batch.py sources.txt -o results.jsonl --threads 8
+    python batch.py sources.txt -o results.parquet --processes 2 --threads 4
+
+``sources.txt`` holds one Blinkit product URL or label image path per line;
+blank lines and lines starting with # are ignored. Every finished source is
+appended to a JSONL checkpoint right away, so an interrupted run picks up
+where it stopped when started again with the same output: sources that
+already succeeded are skipped, failed ones are retried. For Parquet output
+(needs pyarrow) the checkpoint is ``<output>.checkpoint.jsonl`` and the
+Parquet file is written from it at the end.
+
+Threads in a process share that process's browser pool and in-memory state;
+all processes share the SQLite caches under cache/.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def read_sources(path):
+    """Sources in file order, without duplicates, blank lines or comments"""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def is_url_source(source):
+    return source.startswith(("http://", "https://"))
+
+
+def read_checkpoint(path):
+    """Records already written to a JSONL checkpoint; a torn last line is ignored"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Ignoring unreadable checkpoint line: {line[:80]!r}")
+    return records
+
+
+class CheckpointWriter:
+    """Appends one JSON record per line and flushes it to disk immediately"""
+
+    def __init__(self, path):
+        torn = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(path, "a", encoding="utf-8")
+        # Finish a line torn by a crash so the next record starts on its own line
+        if torn:
+            self._file.write("\n")
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def analyze_source(source, use_cache=True):
+    """Run one analysis and wrap the outcome in a checkpoint record"""
+    from analyze import analyze_product
+
+    is_url = is_url_source(source)
+    start = time.perf_counter()
+    try:
+        result = analyze_product(source, is_url=is_url, use_cache=use_cache)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    record = {
+        "source": source,
+        "kind": "url" if is_url else "image",
+        "success": bool(result.get("success")),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "finished_at": time.time(),
+    }
+    if record["success"]:
+        record["data"] = result["data"]
+    else:
+        record["error"] = result.get("error")
+    return record
+
+
+def run_threads(sources, threads, use_cache, emit):
+    """Analyze ``sources`` on a thread pool, passing each record to ``emit`` as it finishes"""
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="batch") as executor:
+        futures = [executor.submit(analyze_source, source, use_cache) for source in sources]
+        try:
+            for future in as_completed(futures):
+                emit(future.result())
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def configure_logging():
+    """Only warnings from the pipeline by default, so the progress lines stay readable; see LOG_LEVEL"""
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+        format="%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s",
+    )
+
+
+# How often run_processes checks for workers that died without finishing
+WORKER_POLL_INTERVAL = 1.0
+
+
+def _process_worker(index, sources, threads, use_cache, results):
+    configure_logging()
+    try:
+        run_threads(sources, threads, use_cache, results.put)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Sentinel: this worker is done
+        results.put(index)
+
+
+def run_processes(sources, processes, threads, use_cache, emit):
+    """
+    Split ``sources`` round-robin over ``processes`` worker processes, each
+    running ``threads`` analyses at a time, and pass every record to ``emit``
+    in this process as it arrives. A worker that exits without finishing
+    (killed, e.g. by the OOM killer) is given up on; returns the sources
+    such workers left unprocessed.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    shares = [sources[i::processes] for i in range(processes)]
+    workers = [
+        context.Process(target=_process_worker, args=(i, shares[i], threads, use_cache, results))
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    running = set(range(len(workers)))
+    emitted = set()
+    lost = []
+    try:
+        while running:
+            try:
+                record = results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                # Nothing left in the queue, so a dead worker's records have all arrived
+                for index in sorted(running):
+                    exitcode = workers[index].exitcode
+                    if exitcode is not None:
+                        running.discard(index)
+                        unprocessed = [source for source in shares[index] if source not in emitted]
+                        print(f"Worker {index} exited with code {exitcode} before finishing; "
+                              f"{len(unprocessed)} source(s) not analyzed")
+                        lost.extend(unprocessed)
+                continue
+            if isinstance(record, int):
+                running.discard(record)
+            else:
+                emitted.add(record["source"])
+                emit(record)
+        return lost
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+
+class Progress:
+    """Counts finished sources and prints throughput every ``every`` records"""
+
+    def __init__(self, total, every=10):
+        self.total = total
+        self.every = every
+        self.started_at = time.perf_counter()
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+        done = len(self.records)
+        if done % self.every == 0 or done == self.total:
+            elapsed = time.perf_counter() - self.started_at
+            rate = done / elapsed if elapsed else 0.0
+            eta = (self.total - done) / rate if rate else 0.0
+            failed = sum(not r["success"] for r in self.records)
+            print(f"[{done}/{self.total}] {rate * 60:.1f}/min, {failed} failed, ETA {eta:.0f}s")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        done = len(self.records)
+        durations = sorted(r["duration_ms"] for r in self.records)
+        print("\n=== Batch Summary ===")
+        print(f"analyzed:     {done} in {elapsed:.1f}s ({done / elapsed * 60 if elapsed else 0:.1f}/min)")
+        print(f"succeeded:    {sum(r['success'] for r in self.records)}")
+        print(f"failed:       {sum(not r['success'] for r in self.records)}")
+        print(f"cached:       {sum(bool(r.get('data', {}).get('cached')) for r in self.records)}")
+        if durations:
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            print(f"latency:      p50 {statistics.median(durations):.0f} ms, p95 {p95:.0f} ms")
+
+        stages = {}
+        for record in self.records:
+            for stage, timing in record.get("data", {}).get("timings", {}).items():
+                if isinstance(timing, dict):
+                    stages.setdefault(stage, []).append(timing["duration_ms"])
+        for stage, values in sorted(stages.items()):
+            print(f"  {stage:15} mean {statistics.mean(values):8.0f} ms")
+
+
+def write_parquet(records, path):
+    """One row per source; nested results are stored as JSON strings"""
+    import pandas as pd
+
+    rows = [
+        {
+            "source": record["source"],
+            "kind": record["kind"],
+            "success": record["success"],
+            "duration_ms": record["duration_ms"],
+            "finished_at": record["finished_at"],
+            "error": record.get("error"),
+            "data": json.dumps(record["data"]) if "data" in record else None,
+        }
+        for record in records
+    ]
+    pd.DataFrame(rows).to_parquet(path, index=False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a file of Blinkit URLs or label image paths")
+    parser.add_argument("sources", help="file with one URL or image path per line")
+    parser.add_argument("-o", "--output", required=True, help="results file (.jsonl or .parquet)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"],
+                        help="output format (default: from the output extension)")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent analyses per process")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes")
+    parser.add_argument("--browsers", type=int, help="browser pool size per process (DRIVER_POOL_SIZE)")
+    parser.add_argument("--no-cache", action="store_true", help="re-analyze products even if cached")
+    parser.add_argument("--progress-every", type=int, default=10, help="print progress every N results")
+    parser.add_argument("--log-level", help="pipeline log level (default: LOG_LEVEL or WARNING)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    if output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("Parquet output needs pyarrow: pip install pyarrow")
+        return 2
+    checkpoint_path = args.output if output_format == "jsonl" else f"{args.output}.checkpoint.jsonl"
+
+    if args.browsers:
+        # Read when blinkit is first imported, here or in the worker processes
+        os.environ["DRIVER_POOL_SIZE"] = str(args.browsers)
+    if args.log_level:
+        # Inherited by the worker processes
+        os.environ["LOG_LEVEL"] = args.log_level
+    configure_logging()
+
+    sources = read_sources(args.sources)
+    finished = {record["source"] for record in read_checkpoint(checkpoint_path) if record.get("success")}
+    pending = [source for source in sources if source not in finished]
+    print(f"{len(sources)} sources, {len(sources) - len(pending)} already done, {len(pending)} to analyze")
+
+    writer = CheckpointWriter(checkpoint_path)
+    progress = Progress(len(pending), every=args.progress_every)
+
+    def emit(record):
+        writer.write(record)
+        progress.add(record)
+
+    interrupted = False
+    lost = []
+    try:
+        if args.processes > 1:
+            lost = run_processes(pending, args.processes, args.threads, not args.no_cache, emit)
+        elif pending:
+            run_threads(pending, args.threads, not args.no_cache, emit)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\nInterrupted; run the same command again to resume.")
+    finally:
+        writer.close()
+
+    progress.summary()
+    if interrupted:
+        return 130
+    if lost:
+        print(f"\n{len(lost)} source(s) were not analyzed because a worker process died:")
+        for source in lost:
+            print(f"  {source}")
+        print("Run the same command again to analyze them.")
+        return 1
+
+    if output_format == "parquet":
+        # Latest record per source, so retried failures replace the earlier attempt
+        latest = {record["source"]: record for record in read_checkpoint(checkpoint_path)}
+        write_parquet(list(latest.values()), args.output)
+        print(f"Wrote {len(latest)} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
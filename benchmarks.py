@@ -0,0 +1,354 @@
+"""
+Micro-benchmarks for the analysis pipeline.
+
+Run one with ``python benchmarks.py <name>``; ``python benchmarks.py`` lists them.
+"""
+import json
+import sys
+import time
+
+# Ingredients as they come back from the extraction prompt
+SAMPLE_INGREDIENTS = [
+    "REFINED WHEAT FLOUR (MAIDA)",
+    "SUGAR",
+    "EDIBLE VEGETABLE OIL (PALM OIL)",
+    "IODISED SALT",
+    "INVERT SYRUP",
+    "MILK SOLIDS",
+    "COCOA SOLIDS",
+    "EMULSIFIERS (322, 471)",
+    "RAISING AGENTS (500(ii), 503(ii))",
+    "ACIDITY REGULATOR (330)",
+    "PRESERVATIVES (202 & 282)",
+    "ARTIFICIAL FLAVOURING SUBSTANCES (VANILLA)",
+    "Gum arabic",
+    "Butylated hydroxytoluene",
+    "BHT",
+    "Caramel",
+    "Sodium benzoate",
+    "Potassium sorbate",
+    "Citric acid",
+    "Aspartame",
+    "Titanium dioxide",
+    "Corn starch",
+    "Soy lecithin",
+    "Glucose syrup",
+    "Maltodextrin",
+]
+
+# A nutrition label as it comes back from the extraction prompt
+SAMPLE_LABEL = {
+    "Energy": "405kcal",
+    "Protein": "5g",
+    "Carbohydrate": "58g",
+    "of which Sugars": "26.5g",
+    "Fat": "17g",
+    "Saturated fatty acids": "8g",
+    "Trans fatty acids": "0g",
+    "Cholesterol": "65mg",
+    "Sodium (mg)": "320",
+    "Iron": "1.2 mg",
+}
+
+
+# Nutrition label keys as they appear on Indian packs, typos included
+LABEL_KEYS = [
+    "Energy", "Energy (kcal)", "Energy Value", "Total Energy", "Energy per 100g",
+    "Protein", "Protein (g)", "Protien",
+    "Carbohydrate", "Carbohydrates", "Total Carbohydrate", "Carbohydrte",
+    "of which Sugars", "Total Sugars", "Sugar", "Added Sugars", "Added Sugar (g)",
+    "Dietary Fibre", "Fibre", "Dietary Fiber",
+    "Fat", "Total Fat", "Total Fat (g)", "Saturated Fat", "Saturated fatty acids",
+    "Satuated Fat", "Fatty acids, saturated", "Mono unsaturated fatty acids",
+    "Poly unsaturated fatty acids", "Trans fatty acids", "Trans Fat",
+    "Cholesterol", "Cholesterol (mg)", "Sodium", "Sodium (mg)",
+    "Calcium", "Iron", "Potassium", "Zinc", "Magnesium",
+    "Vitamin A", "Vitamin C", "Vitamin D", "Vitamin B12", "Vitamin B-12", "Folic Acid",
+]
+
+
+# Chunk sizes of a streamed Gemini extraction response: a short first chunk,
+# then a few hundred characters at a time
+STREAM_CHUNK_SIZES = [14, 96, 188, 241, 263, 270, 255, 282, 266, 274]
+
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _lookup_ingredient_safety_scan(ingredient_name, cas_number, reference_data):
+    """The original per-ingredient DataFrame scan, kept as the benchmark baseline"""
+    safety_info = []
+
+    scogs_match = reference_data['scogs'][
+        (reference_data['scogs']['GRAS Substance'].str.contains(ingredient_name, case=False, na=False)) |
+        (reference_data['scogs']['CAS Reg. No. or other ID CODE'] == cas_number)
+    ]
+    if not scogs_match.empty:
+        safety_info.append(f"FDA SCOGS Status: {scogs_match.iloc[0]['SCOGS Type of Conclusion']}")
+
+    monographs_match = reference_data['monographs'][
+        (reference_data['monographs']['Agent'].str.contains(ingredient_name, case=False, na=False)) |
+        (reference_data['monographs']['CAS No.'] == cas_number)
+    ]
+    if not monographs_match.empty:
+        safety_info.append(f"IARC Classification: Group {monographs_match.iloc[0]['Group']}")
+
+    roc_match = reference_data['roc'][
+        (reference_data['roc']['NAME OR SYNONYM'].str.contains(ingredient_name, case=False, na=False)) |
+        (reference_data['roc']['CASRN'] == cas_number)
+    ]
+    if not roc_match.empty:
+        safety_info.append(f"Report on Carcinogens Status: {roc_match.iloc[0]['Listing in the 15th RoC']}")
+
+    return safety_info if safety_info else ["No safety classification found in reference databases"]
+
+
+def bench_lookup(repeat=20):
+    """Safety lookup: DataFrame scan vs prebuilt index, per ingredient and per product"""
+    from analyze import load_reference_data, lookup_ingredient_safety, lookup_ingredients_safety
+
+    reference_data = load_reference_data()
+
+    def scan():
+        for ingredient in SAMPLE_INGREDIENTS:
+            _lookup_ingredient_safety_scan(ingredient, None, reference_data)
+
+    def indexed():
+        for ingredient in SAMPLE_INGREDIENTS:
+            lookup_ingredient_safety(ingredient, None, reference_data)
+
+    def batch():
+        lookup_ingredients_safety(SAMPLE_INGREDIENTS, reference_data)
+
+    batch_results = lookup_ingredients_safety(SAMPLE_INGREDIENTS, reference_data)
+    batch_mismatches = [
+        ingredient
+        for ingredient in SAMPLE_INGREDIENTS
+        if batch_results[ingredient] != lookup_ingredient_safety(ingredient, None, reference_data)
+    ]
+
+    lost, added = [], []
+    for ingredient in SAMPLE_INGREDIENTS:
+        before = set(_lookup_ingredient_safety_scan(ingredient, None, reference_data))
+        after = set(lookup_ingredient_safety(ingredient, None, reference_data))
+        before.discard("No safety classification found in reference databases")
+        after.discard("No safety classification found in reference databases")
+        if before - after:
+            lost.append(ingredient)
+        if after - before:
+            added.append(ingredient)
+
+    count = len(SAMPLE_INGREDIENTS)
+    before = _timeit(scan, repeat) / count
+    after = _timeit(indexed, repeat) / count
+    print(f"ingredients:        {count}")
+    print(f"scan per lookup:    {before * 1e6:10.1f} us")
+    print(f"index per lookup:   {after * 1e6:10.1f} us")
+    print(f"batch per product:  {_timeit(batch, repeat) * 1e6:10.1f} us")
+    print(f"speedup:            {before / after:10.1f}x")
+    print(f"batch mismatches:   {batch_mismatches or 'none'}")
+    print(f"results lost:       {lost or 'none'}")
+    print(f"results added:      {len(added)} ingredients gained matches")
+
+
+def _synthetic_carousel(count=6, edge=1200):
+    """Label-like images full of text plus plain product shots, as in a Blinkit carousel"""
+    import random
+
+    import PIL.Image
+    import PIL.ImageDraw
+
+    rng = random.Random(0)
+    images = []
+    for i in range(count):
+        image = PIL.Image.new("RGB", (edge, edge), (240, 240, 240))
+        draw = PIL.ImageDraw.Draw(image)
+        if i % 2:
+            for y in range(20, edge - 20, 18):
+                words = ["".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.randint(3, 9))) for _ in range(12)]
+                draw.text((20, y), " ".join(words), fill="black")
+        else:
+            draw.ellipse((edge // 6, edge // 6, edge * 5 // 6, edge * 5 // 6), fill=(180, 40, 60))
+        # Sensor noise, so the images compress like photos rather than flat drawings
+        noise = PIL.Image.effect_noise((edge, edge), 24).convert("RGB")
+        images.append(PIL.Image.blend(image, noise, 0.1))
+    return images
+
+
+def bench_image_prep(repeat=3):
+    """Bytes and encode latency per image set: SDK default upload vs prepared blobs"""
+    from io import BytesIO
+
+    from image_prep import ImagePrepConfig, prepare_images
+
+    images = _synthetic_carousel()
+
+    def sdk_default():
+        # What the Gemini SDK does with a PIL image that has no source file
+        sizes = []
+        for image in images:
+            buffer = BytesIO()
+            image.save(buffer, format="webp", lossless=True)
+            sizes.append(len(buffer.getvalue()))
+        return sizes
+
+    configs = {
+        "sdk default (lossless webp)": None,
+        "jpeg q85, 1600px": ImagePrepConfig(),
+        "jpeg q80, 1024px": ImagePrepConfig(max_edge=1024, quality=80),
+        "jpeg q85, drop textless": ImagePrepConfig(drop_textless=True),
+    }
+    print(f"image set: {len(images)} images, {images[0].size[0]}x{images[0].size[1]}")
+    for name, config in configs.items():
+        if config is None:
+            run = sdk_default
+            sizes = sdk_default()
+        else:
+            run = lambda config=config: prepare_images(images, config)
+            sizes = [len(blob["data"]) for blob in run()]
+        latency = _timeit(run, repeat)
+        print(f"{name:30} {len(sizes)} images {sum(sizes) / 1024:10.1f} KiB {latency * 1000:8.1f} ms")
+
+
+def bench_nutrition(labels=5000, repeat=3):
+    """Nutrition scoring: one label at a time vs one vectorized batch"""
+    from nutrition import nutrition_summary, score_labels
+
+    batch = [dict(SAMPLE_LABEL) for _ in range(labels)]
+    sample = batch[:200]
+
+    def single():
+        for label in sample:
+            nutrition_summary(label)
+
+    per_label = _timeit(single, repeat) / len(sample)
+    batched = _timeit(lambda: score_labels(batch), repeat)
+    print(f"labels:             {labels}")
+    print(f"single per label:   {per_label * 1e6:10.1f} us")
+    print(f"batch per label:    {batched / labels * 1e6:10.1f} us")
+    print(f"batch throughput:   {labels / batched:10.0f} labels/s")
+
+
+def _resolve_nutrient_linear(key):
+    """Case-insensitive scan of the nested alternate-name lists, the baseline"""
+    from daily_values import fda_daily_values
+
+    key = key.strip().lower()
+    for nutrient in fda_daily_values["nutrients"]:
+        for name in [nutrient["name"]] + nutrient["alternate_names"]:
+            if name.lower() == key:
+                return nutrient["name"]
+    return None
+
+
+def bench_nutrient_names(repeat=200):
+    """Nutrient name resolution: linear alternate-name scan vs compiled resolver"""
+    from nutrition import NutrientResolver, nutrient_resolver
+    from daily_values import fda_daily_values
+
+    def linear():
+        for key in LABEL_KEYS:
+            _resolve_nutrient_linear(key)
+
+    def warm():
+        for key in LABEL_KEYS:
+            nutrient_resolver.resolve(key)
+
+    def cold():
+        nutrient_resolver.resolve_fuzzy.cache_clear()
+        warm()
+
+    count = len(LABEL_KEYS)
+    build = _timeit(lambda: NutrientResolver(fda_daily_values["nutrients"]), 20)
+    linear_matched = sum(_resolve_nutrient_linear(key) is not None for key in LABEL_KEYS)
+    resolver_matched = sum(nutrient_resolver.resolve(key) is not None for key in LABEL_KEYS)
+    print(f"label keys:         {count}")
+    print(f"resolver build:     {build * 1e3:10.2f} ms")
+    print(f"linear per key:     {_timeit(linear, repeat) / count * 1e6:10.1f} us")
+    print(f"cold per key:       {_timeit(cold, repeat // 10) / count * 1e6:10.1f} us")
+    print(f"warm per key:       {_timeit(warm, repeat) / count * 1e6:10.1f} us")
+    print(f"matched (linear):   {linear_matched}/{count}")
+    print(f"matched (resolver): {resolver_matched}/{count}")
+
+
+def _sample_extraction_response():
+    """The extraction prompt's own example answer, fenced the way Gemini returns it"""
+    from prompts import extract_ingredients_and_nutrition_prompt
+
+    example = extract_ingredients_and_nutrition_prompt.split("Here is an example of the output format:")[1]
+    document = json.loads(example[example.index("{"):example.rindex("}") + 1])
+    return "```json\n" + json.dumps(document, indent=4) + "\n```\n", document
+
+
+def _split_chunks(text, sizes):
+    chunks, start = [], 0
+    for size in sizes:
+        chunks.append(text[start:start + size])
+        start += size
+    while start < len(text):
+        chunks.append(text[start:start + sizes[-1]])
+        start += sizes[-1]
+    return [chunk for chunk in chunks if chunk]
+
+
+def bench_stream_parse(repeat=200, chunk_interval_ms=80):
+    """Streamed extraction: incremental ingredient parsing vs parsing the full response"""
+    import random
+
+    from incremental_json import IngredientStreamParser
+
+    text, document = _sample_extraction_response()
+    recorded = _split_chunks(text, STREAM_CHUNK_SIZES)
+
+    def incremental(chunks):
+        parser = IngredientStreamParser()
+        emitted = []
+        for chunk in chunks:
+            emitted.extend(parser.feed(chunk))
+        return emitted, parser.result()
+
+    # The same response replayed with many other chunkings must parse identically
+    rng = random.Random(0)
+    sequences = [recorded] + [_split_chunks(text, [size]) for size in (1, 2, 3, 7, 64, 4096)]
+    sequences += [_split_chunks(text, [rng.randint(1, 300) for _ in range(40)]) for _ in range(50)]
+    mismatches = sum(incremental(chunks) != (document["ingredients"], document) for chunks in sequences)
+
+    # When each ingredient became available, with one chunk every chunk_interval_ms
+    parser = IngredientStreamParser()
+    ready_at = []
+    for position, chunk in enumerate(recorded, 1):
+        ready_at.extend([position * chunk_interval_ms] * len(parser.feed(chunk)))
+    end = len(recorded) * chunk_interval_ms
+
+    full = _timeit(lambda: json.loads("".join(recorded).strip().strip("```json").strip()), repeat)
+    streamed = _timeit(lambda: incremental(recorded), repeat)
+    print(f"response:           {len(text)} chars in {len(recorded)} chunks, "
+          f"{len(document['ingredients'])} ingredients")
+    print(f"full parse:         {full * 1e6:10.1f} us")
+    print(f"incremental parse:  {streamed * 1e6:10.1f} us (all chunks)")
+    print(f"first ingredient:   {end - ready_at[0]:10.0f} ms before the end of the stream")
+    print(f"mean head start:    {end - sum(ready_at) / len(ready_at):10.0f} ms per ingredient")
+    print(f"chunkings checked:  {len(sequences)}, mismatches: {mismatches or 'none'}")
+
+
+BENCHMARKS = {
+    "lookup": bench_lookup,
+    "image_prep": bench_image_prep,
+    "nutrition": bench_nutrition,
+    "nutrient_names": bench_nutrient_names,
+    "stream_parse": bench_stream_parse,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: python benchmarks.py <benchmark>")
+        for name, fn in BENCHMARKS.items():
+            print(f"  {name:15} {fn.__doc__}")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]]()
@@ -11,44 +11,66 @@ import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import json
+import logging
 import PIL.Image
 import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
 import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
 
 
 from prompts import analyze_food_prompt
+from driver_pool import DriverPool
+import metrics
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def setup_driver():
-    print("Setting up the Chrome driver...")
+
+def setup_driver(headless=True):
+    logger.info("Setting up the Chrome driver...")
     chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
     service = Service(os.getenv("CHROMEDRIVER_PATH"))
     driver = webdriver.Chrome(service=service, options=chrome_options)
     driver.set_window_size(1920, 1080)
-    print("Chrome driver setup complete.")
+    logger.info("Chrome driver setup complete.")
     return driver
 
 
+# Warm browsers shared by every request; see driver_pool.DriverPool
+driver_pool = DriverPool(
+    lambda: setup_driver(headless=os.getenv("CHROME_HEADLESS", "1") != "0"),
+    size=int(os.getenv("DRIVER_POOL_SIZE", "2")),
+    max_pages=int(os.getenv("DRIVER_MAX_PAGES", "50")),
+)
+
+
 def close_popup(driver):
-    print("Attempting to close the popup...")
+    logger.debug("Attempting to close the popup...")
     try:
         close_button = WebDriverWait(driver, 5).until(
             EC.presence_of_element_located((By.XPATH, "//img[@alt='Close Slider']"))
         )
         close_button.click()
-        print("Popup closed successfully.")
+        logger.debug("Popup closed successfully.")
     except TimeoutException:
-        print("No popup found or popup didn't appear within the timeout.")
+        logger.debug("No popup found or popup didn't appear within the timeout.")
     except NoSuchElementException:
-        print("Close button not found. Popup may not be present.")
+        logger.debug("Close button not found. Popup may not be present.")
     except Exception as e:
-        print(f"An error occurred while trying to close the popup: {str(e)}")
+        logger.warning("An error occurred while trying to close the popup: %s", e)
 
 
 def extract_product_info(driver):
-    print("Extracting product name...")
+    logger.debug("Extracting product name...")
     try:
         product_name = (
             WebDriverWait(driver, 10)
@@ -60,15 +82,15 @@ def extract_product_info(driver):
             )
             .text
         )
-        print(f"Product name extracted: {product_name}")
+        logger.debug("Product name extracted: %s", product_name)
         return product_name
     except Exception as e:
-        print(f"Error extracting product name: {str(e)}")
+        logger.warning("Error extracting product name: %s", e)
         return None
 
 
 def extract_image_urls(driver, url):
-    print(f"Navigating to URL: {url}")
+    logger.info("Navigating to URL: %s", url)
     driver.get(url)
 
     close_popup(driver)
@@ -77,49 +99,227 @@ def extract_image_urls(driver, url):
     product_name = extract_product_info(driver)
 
     image_selector = ".ProductCarousel__CarouselImage-sc-11ow1fv-4"
-    print("Waiting for product images to load...")
+    logger.debug("Waiting for product images to load...")
     try:
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, image_selector))
         )
     except TimeoutException:
-        print("Timed out waiting for product images to load.")
+        logger.warning("Timed out waiting for product images to load.")
         return product_name, []  # Return product name even if no images found
 
     images = driver.find_elements(By.CSS_SELECTOR, image_selector)
     image_urls = [img.get_attribute("src") for img in images if img.get_attribute("src")]
-    print(f"Extracted {len(image_urls)} image URLs.")
+    logger.info("Extracted %d image URLs.", len(image_urls))
 
     return product_name, image_urls
 
 
 def extract_image_urls_from_url(url):
-    driver = setup_driver()
-    try:
+    with metrics.provider_call("blinkit_browser"), driver_pool.driver() as driver:
         return extract_image_urls(driver, url)
-    finally:
-        print("Closing the browser...")
-        driver.quit()
 
 
-def open_image_from_url(image_url):
-    print(f"Opening image from URL: {image_url}")
+@dataclass
+class ScrapeContext:
+    """What one request scraped from a product page, passed through the analysis pipeline"""
+    url: str
+    product_name: str = None
+    image_urls: list = field(default_factory=list)
+    source: str = None  # "http" or "selenium"
+
+
+def extract_prid(url):
+    """Return the stable Blinkit product id from a /prid/<id> URL, or None"""
+    match = re.search(r"/prid/(\d+)", url or "")
+    return match.group(1) if match else None
+
+
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "8"))
+
+# Connection-pooled session shared by page fetches and image downloads
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_FETCH_WORKERS * 2))
+http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_FETCH_WORKERS * 2))
+
+SCRAPE_HTTP_FIRST = os.getenv("SCRAPE_HTTP_FIRST", "1") != "0"
+SCRAPE_HTTP_TIMEOUT = float(os.getenv("SCRAPE_HTTP_TIMEOUT", "5"))
+PAGE_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-IN,en;q=0.9",
+}
+
+
+class _ProductPageParser(HTMLParser):
+    """Collects the parts of a product page that carry its name and images"""
+
+    def __init__(self):
+        super().__init__()
+        self.json_ld = []
+        self.meta = {}
+        self.carousel_images = []
+        self.name_parts = []
+        self._in_json_ld = False
+        self._name_tag = None
+        self._name_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        css_class = attrs.get("class") or ""
+        if tag == "script" and attrs.get("type") == "application/ld+json":
+            self._in_json_ld = True
+            self.json_ld.append("")
+        elif tag == "meta" and attrs.get("content"):
+            key = attrs.get("property") or attrs.get("name")
+            if key:
+                self.meta.setdefault(key.lower(), attrs["content"])
+        elif tag == "img" and "ProductCarousel__CarouselImage" in css_class and attrs.get("src"):
+            self.carousel_images.append(attrs["src"])
+
+        if self._name_tag is not None:
+            if tag == self._name_tag:
+                self._name_depth += 1
+        elif "ProductInfoCard__ProductName" in css_class and not self.name_parts:
+            self._name_tag = tag
+            self._name_depth = 1
+
+    def handle_endtag(self, tag):
+        if tag == "script":
+            self._in_json_ld = False
+        if tag == self._name_tag:
+            self._name_depth -= 1
+            if self._name_depth == 0:
+                self._name_tag = None
+
+    def handle_data(self, data):
+        if self._in_json_ld:
+            self.json_ld[-1] += data
+        if self._name_tag is not None:
+            self.name_parts.append(data)
+
+
+def _json_ld_products(blocks):
+    for block in blocks:
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            types = item.get("@type")
+            if types == "Product" or (isinstance(types, list) and "Product" in types):
+                yield item
+
+
+# JSON-LD often lists only the hero shot; the label photos are in the
+# carousel, so fewer images than this means the browser has to look
+MIN_JSON_LD_IMAGES = 2
+
+
+def parse_product_page(html):
+    """
+    Pull the product name and carousel image URLs out of a product page's
+    HTML. Looks at the rendered carousel and name card, then at JSON-LD
+    Product data, then at the Open Graph title. Returns (product_name,
+    image_urls), or None when the page has no carousel and JSON-LD lists
+    fewer than MIN_JSON_LD_IMAGES images, so the caller falls back to the
+    browser.
+    """
+    parser = _ProductPageParser()
+    parser.feed(html)
+    parser.close()
+
+    product_name = " ".join("".join(parser.name_parts).split()) or None
+    image_urls = list(parser.carousel_images)
+    for product in _json_ld_products(parser.json_ld):
+        product_name = product_name or product.get("name")
+        if not image_urls:
+            images = product.get("image") or []
+            images = [images] if isinstance(images, (str, dict)) else images
+            image_urls = [image.get("url") if isinstance(image, dict) else image for image in images]
+    if not product_name and parser.meta.get("og:title"):
+        product_name = parser.meta["og:title"]
+
+    image_urls = list(dict.fromkeys(url for url in image_urls if isinstance(url, str) and url))
+    if not image_urls or (not parser.carousel_images and len(image_urls) < MIN_JSON_LD_IMAGES):
+        return None
+    return product_name, image_urls
+
+
+def fetch_product_page(url, timeout=SCRAPE_HTTP_TIMEOUT):
+    with metrics.provider_call("blinkit_http") as call:
+        response = http_session.get(url, headers=PAGE_HEADERS, timeout=timeout)
+        response.raise_for_status()
+        call.add(bytes=len(response.content))
+        return response.text
+
+
+def scrape_product(url):
+    """
+    Scrape a product page once and return its ScrapeContext. The page is
+    first fetched over plain HTTP and parsed; a browser from the pool is
+    only used when that fails or finds no images.
+    """
+    if SCRAPE_HTTP_FIRST:
+        try:
+            parsed = parse_product_page(fetch_product_page(url))
+        except Exception as e:
+            logger.warning("Error fetching product page over HTTP: %s", e)
+            parsed = None
+        if parsed:
+            product_name, image_urls = parsed
+            logger.info("Extracted %d image URLs over HTTP.", len(image_urls))
+            return ScrapeContext(url=url, product_name=product_name, image_urls=image_urls, source="http")
+        logger.info("Could not parse product page over HTTP, falling back to the browser.")
+
+    product_name, image_urls = extract_image_urls_from_url(url)
+    return ScrapeContext(url=url, product_name=product_name, image_urls=image_urls, source="selenium")
+
+_image_fetch_executor = ThreadPoolExecutor(max_workers=IMAGE_FETCH_WORKERS, thread_name_prefix="image-fetch")
+
+
+def open_image_from_url(image_url, timeout=IMAGE_FETCH_TIMEOUT):
+    logger.debug("Opening image from URL: %s", image_url)
     try:
-        response = requests.get(image_url)
-        response.raise_for_status()  # Ensure the request was successful
+        with metrics.provider_call("image_cdn") as call:
+            response = http_session.get(image_url, timeout=timeout)
+            response.raise_for_status()  # Ensure the request was successful
+            call.add(bytes=len(response.content))
         image = PIL.Image.open(BytesIO(response.content))
-        print("Image opened successfully.")
+        image.load()  # Decode here rather than lazily on the caller's thread
+        logger.debug("Image opened successfully.")
         return image
     except Exception as e:
-        print(f"Error opening image from URL {image_url}: {str(e)}")
+        logger.warning("Error opening image from URL %s: %s", image_url, e)
         return None
 
 
+def fetch_images(image_urls):
+    """
+    Download and decode images concurrently on the shared session.
+
+    Each distinct URL is fetched once; the result keeps the order of first
+    appearance (the carousel order) and leaves out images that failed.
+    """
+    unique_urls = list(dict.fromkeys(image_urls))
+    images = _image_fetch_executor.map(open_image_from_url, unique_urls)
+    images = [image for image in images if image is not None]
+    metrics.add(items=len(images))
+    return images
+
+
 def modify_image_url(url):
-    print(f"Modifying image URL: {url}")
+    logger.debug("Modifying image URL: %s", url)
     # Check if url is a string
     if not isinstance(url, str):
-        print(f"Warning: Expected string URL but got {type(url)}. Returning original value.")
+        logger.warning("Expected string URL but got %s. Returning original value.", type(url))
         return url
 
     # Pattern to match w, h, and q parameters
@@ -132,12 +332,13 @@ def modify_image_url(url):
     modified_url = re.sub(width_pattern, ",w=1200", modified_url)
     modified_url = re.sub(quality_pattern, ",q=100", modified_url)
 
-    print(f"Modified URL: {modified_url}")
+    logger.debug("Modified URL: %s", modified_url)
     return modified_url
 
 
 if __name__ == "__main__":
-    print("Starting the image extraction process...")
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    logger.info("Starting the image extraction process...")
     url = "https://blinkit.com/prn/britannia-fruit-cake/prid/336628"
     product_name, image_urls = extract_image_urls_from_url(url)
     modified_image_urls = [modify_image_url(url) for url in image_urls]
@@ -145,16 +346,12 @@ if __name__ == "__main__":
     genai.configure(api_key=os.getenv("GEMINI_API_KEY_2"))
     model = genai.GenerativeModel("gemini-1.5-pro")
 
-    print("Opening images and generating content...")
-    image_list = [
-        open_image_from_url(image_url)
-        for image_url in modified_image_urls
-        if open_image_from_url(image_url) is not None
-    ]
+    logger.info("Opening images and generating content...")
+    image_list = fetch_images(modified_image_urls)
     prompt = [analyze_food_prompt]
 
     response = model.generate_content(prompt + image_list)
-    print("Content generated successfully.")
+    logger.info("Content generated successfully.")
     print(response.text)
     data = json.loads(response.text.strip().strip("```json").strip("```"))
     print(data)
@@ -0,0 +1,130 @@
+"""
+Builds the product payload sent to the analysis LLM within a token budget.
+
+The label data, nutrition summary and safety findings always go in. Google
+search results are the bulk of a naive payload (up to ten titles, snippets
+and links per ingredient), so they are de-duplicated, ranked and cut down:
+every ingredient gets its best snippet before any ingredient gets a second
+one, snippets are shortened, links are left out, and results stop being
+added once the budget is reached.
+
+Token counts are estimated at four characters per token, which is close
+enough for English JSON to keep prompts well clear of the context limit.
+"""
+import json
+import os
+import re
+
+from safety_index import NO_CLASSIFICATION, normalize_name
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_SNIPPETS_PER_INGREDIENT = int(os.getenv("CONTEXT_SNIPPETS_PER_INGREDIENT", "3"))
+CONTEXT_SNIPPET_CHARS = int(os.getenv("CONTEXT_SNIPPET_CHARS", "300"))
+
+CHARS_PER_TOKEN = 4
+
+_WORD = re.compile(r"[a-z]{3,}")
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _compact(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _shorten(text, limit):
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def _relevance(ingredient, result):
+    """How many of the ingredient's words the result mentions"""
+    words = set(_WORD.findall(normalize_name(ingredient)))
+    text = normalize_name(f"{result.get('title') or ''} {result.get('snippet') or ''}")
+    return sum(word in text for word in words)
+
+
+def rank_search_results(search_results, per_ingredient=CONTEXT_SNIPPETS_PER_INGREDIENT):
+    """
+    Flatten ``{ingredient: [result, ...]}`` into (ingredient, result) pairs
+    in the order they should be spent: the best result of every ingredient
+    first, then the second best, and so on. Results without a snippet,
+    repeated links and snippets already used for another ingredient are
+    dropped. Returns (ranked pairs, number of duplicates dropped).
+    """
+    seen_links = set()
+    seen_snippets = set()
+    duplicates = 0
+    per_ingredient_results = []
+    for ingredient, results in (search_results or {}).items():
+        kept = []
+        ranked = sorted(
+            enumerate(results or []),
+            key=lambda item: (-_relevance(ingredient, item[1]), item[0]),
+        )
+        for _, result in ranked:
+            snippet = normalize_name(result.get("snippet"))
+            if not snippet:
+                continue
+            link = result.get("link")
+            if snippet in seen_snippets or (link and (ingredient, link) in seen_links):
+                duplicates += 1
+                continue
+            seen_snippets.add(snippet)
+            seen_links.add((ingredient, link))
+            kept.append(result)
+        per_ingredient_results.append((ingredient, kept[:per_ingredient]))
+
+    ranked_pairs = []
+    depth = max((len(kept) for _, kept in per_ingredient_results), default=0)
+    for position in range(depth):
+        for ingredient, kept in per_ingredient_results:
+            if position < len(kept):
+                ranked_pairs.append((ingredient, kept[position]))
+    return ranked_pairs, duplicates
+
+
+def build_analysis_context(extracted_data, system_prompt="", budget=CONTEXT_TOKEN_BUDGET,
+                           snippet_chars=CONTEXT_SNIPPET_CHARS):
+    """
+    Return (payload, stats): the compact JSON product payload for the
+    analysis prompt, and a summary of what went into it, including the
+    estimated prompt size in tokens (system prompt included).
+    """
+    base = {key: value for key, value in extracted_data.items() if key != "ingredient_search_results"}
+    safety = base.get("safety_classifications")
+    if isinstance(safety, dict):
+        # Ingredients without findings add nothing the ingredient list doesn't say
+        base["safety_classifications"] = {
+            ingredient: info for ingredient, info in safety.items() if info != [NO_CLASSIFICATION]
+        }
+
+    search_results = extracted_data.get("ingredient_search_results") or {}
+    ranked, duplicates = rank_search_results(search_results)
+    available = sum(len(results or []) for results in search_results.values())
+
+    overhead = estimate_tokens(system_prompt) + estimate_tokens(_compact(base))
+    selected = {}
+    used = overhead + estimate_tokens(_compact({"ingredient_search_results": {}}))
+    for ingredient, result in ranked:
+        entry = {"title": _shorten(result.get("title"), 120), "snippet": _shorten(result.get("snippet"), snippet_chars)}
+        cost = estimate_tokens(_compact(entry)) + (0 if ingredient in selected else estimate_tokens(_compact(ingredient)) + 1)
+        if used + cost > budget:
+            continue
+        selected.setdefault(ingredient, []).append(entry)
+        used += cost
+
+    payload = _compact({**base, "ingredient_search_results": selected})
+    stats = {
+        "estimated_tokens": estimate_tokens(system_prompt) + estimate_tokens(payload),
+        "budget_tokens": budget,
+        "payload_chars": len(payload),
+        "search_results_available": available,
+        "search_results_included": sum(len(entries) for entries in selected.values()),
+        "search_results_duplicates": duplicates,
+    }
+    return payload, stats
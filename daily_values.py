@@ -4,7 +4,6 @@ fda_daily_values = {
             "name": "Added sugars",
             "alternate_names": [
                 "Added sugar",
-                "Sugars",
                 "Refined sugars",
                 "Processed sugars",
             ],
@@ -20,6 +19,11 @@ fda_daily_values = {
             "alternate_names": ["Ca", "Dietary calcium"],
             "daily_value": "1300mg",
         },
+        {
+            "name": "Calories",
+            "alternate_names": ["Energy", "Calorie", "Energy value", "Total energy"],
+            "daily_value": "2000kcal",
+        },
         {
             "name": "Chloride",
             "alternate_names": ["Cl", "Chlorine ion", "Chlorine"],
@@ -149,7 +153,7 @@ fda_daily_values = {
         },
         {
             "name": "Sodium",
-            "alternate_names": ["Na", "Salt", "Dietary sodium"],
+            "alternate_names": ["Na", "Dietary sodium"],
             "daily_value": "2300mg",
         },
         {
@@ -0,0 +1,120 @@
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPoolClosed(Exception):
+    pass
+
+
+class DriverPool:
+    """
+    Bounded pool of warm WebDriver instances.
+
+    At most ``size`` drivers exist at once; callers block in ``checkout`` for
+    up to ``checkout_timeout`` seconds when all of them are busy. Drivers are
+    created lazily by ``factory``, health-checked when handed out, and
+    replaced after ``max_pages`` page loads or when a WebDriverException
+    escapes while they were checked out (the browser most likely crashed).
+    """
+
+    def __init__(self, factory, size=2, max_pages=50, checkout_timeout=60):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._closed = False
+        atexit.register(self.shutdown)
+
+    def _quit(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning("Error closing pooled browser: %s", e)
+
+    def _is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def checkout(self):
+        if self._closed:
+            raise DriverPoolClosed("Driver pool has been shut down")
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No browser available after {self.checkout_timeout}s")
+
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._is_healthy(driver):
+                    return driver
+                logger.info("Discarding unhealthy pooled browser.")
+                self._quit(driver)
+
+            driver = self.factory()
+            with self._lock:
+                self._pages[id(driver)] = 0
+            return driver
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkin(self, driver, broken=False):
+        try:
+            with self._lock:
+                pages = self._pages.get(id(driver), 0) + 1
+                self._pages[id(driver)] = pages
+
+            if broken or self._closed or pages >= self.max_pages:
+                self._quit(driver)
+                return
+
+            try:
+                # Stop the product page's scripts while the browser sits idle
+                driver.get("about:blank")
+            except WebDriverException:
+                self._quit(driver)
+                return
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """Check out a driver for the duration of a ``with`` block"""
+        driver = self.checkout()
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.checkin(driver, broken=broken)
+
+    def shutdown(self):
+        """Quit every idle driver; drivers still checked out are quit on return"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
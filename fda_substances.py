@@ -0,0 +1,196 @@
+"""
+Preprocessing for data/FDA--FoodSubstances.csv ("Substances Added to Food").
+
+The CSV is an export full of ``&diams;``/``<br />`` markup and ``=T("...")``
+Excel wrappers. ``build_food_substance_index`` cleans it once into a compact
+synonym -> CAS -> technical effect/regulation index and pickles it next to the
+CSV, so request-time code never touches the HTML. Run this module directly to
+(re)build the artifact ahead of deployment.
+"""
+import html
+import logging
+import os
+import pickle
+import re
+import tempfile
+from collections import namedtuple
+
+import pandas as pd
+
+from safety_index import name_variants
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+
+FoodSubstance = namedtuple(
+    "FoodSubstance",
+    ["cas", "name", "technical_effects", "regulations", "standards", "prohibited", "fema_status"],
+)
+
+_EXCEL_TEXT = re.compile(r'^=T\("(.*)"\)$')
+_BREAK = re.compile(r"<\s*/?\s*br\s*/?\s*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def artifact_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".pkl"
+
+
+def clean_cell(value):
+    """Strip the Excel wrapper and HTML from a cell, keeping <br /> as newlines"""
+    if not isinstance(value, str):
+        return ""
+    value = value.strip()
+    match = _EXCEL_TEXT.match(value)
+    if match:
+        value = match.group(1)
+    value = _BREAK.sub("\n", value)
+    value = _TAG.sub("", value)
+    value = html.unescape(value).replace("♦", "")
+    return "\n".join(
+        _WHITESPACE.sub(" ", line).strip() for line in value.split("\n")
+    ).strip()
+
+
+def split_cell(value, separator="\n"):
+    """Clean a multi-valued cell and return its non-empty entries"""
+    return [
+        item.strip().rstrip(",").strip()
+        for item in clean_cell(value).split(separator)
+        if item.strip().rstrip(",").strip()
+    ]
+
+
+def _regulations(row, columns):
+    sections = []
+    for column in columns:
+        for section in split_cell(row[column], separator=","):
+            for part in section.split("\n"):
+                part = part.strip()
+                if part and f"21 CFR {part}" not in sections:
+                    sections.append(f"21 CFR {part}")
+    return sections
+
+
+def parse_food_substances(df):
+    """Turn the raw CSV frame into FoodSubstance records and lookup dicts"""
+    reg_columns = [
+        column for column in df.columns
+        if column.startswith("Reg ") and column != "Reg prohibited189"
+    ]
+    standards_columns = [column for column in df.columns if column.startswith("regs ")]
+
+    records = []
+    names = {}
+    cas_index = {}
+    for row_id, row in enumerate(df.to_dict("records")):
+        cas = clean_cell(row["CAS Reg No (or other ID)"])
+        name = clean_cell(row["Substance"])
+        prohibited = _regulations(row, ["Reg prohibited189"])
+        records.append(FoodSubstance(
+            cas=cas,
+            name=name,
+            technical_effects=tuple(split_cell(row["Used for (Technical Effect)"])),
+            regulations=tuple(prohibited or _regulations(row, reg_columns)),
+            standards=tuple(_regulations(row, standards_columns)),
+            prohibited=bool(prohibited),
+            fema_status=clean_cell(row["FEMA status"]),
+        ))
+
+        for key in name_variants(name, ";".join(split_cell(row["Other Names"]))):
+            names.setdefault(key, row_id)
+        if cas:
+            cas_index.setdefault(cas, row_id)
+
+    return records, names, cas_index
+
+
+class FoodSubstanceIndex:
+    """Synonym and CAS lookups over the cleaned FDA Food Substances records"""
+
+    def __init__(self, records, names, cas_index):
+        self.records = records
+        self.names = names
+        self.cas_index = cas_index
+
+    def __len__(self):
+        return len(self.records)
+
+    def find(self, ingredient_name, cas_number=None):
+        """Return the FoodSubstance for a CAS number or name/synonym, or None"""
+        if isinstance(cas_number, str) and cas_number.strip() in self.cas_index:
+            return self.records[self.cas_index[cas_number.strip()]]
+        for key in name_variants(ingredient_name):
+            if key in self.names:
+                return self.records[self.names[key]]
+        return None
+
+    def message(self, substance):
+        """Format a record the same way as the other safety_info strings"""
+        regulations = ", ".join(substance.regulations)
+        if substance.prohibited:
+            return f"FDA Food Substances: Prohibited from use in human food ({regulations})"
+        effects = ", ".join(substance.technical_effects) or "no listed technical effect"
+        if regulations:
+            return f"FDA Food Substances: Used as {effects} ({regulations})"
+        return f"FDA Food Substances: Used as {effects}"
+
+
+def build_food_substance_index(csv_path):
+    """Parse the CSV and write the pickled index next to it; returns the index"""
+    logger.info("Building FDA Food Substances index from %s", csv_path)
+    records, names, cas_index = parse_food_substances(pd.read_csv(csv_path))
+    payload = {
+        "version": ARTIFACT_VERSION,
+        "source_mtime_ns": os.stat(csv_path).st_mtime_ns,
+        "records": [tuple(record) for record in records],
+        "names": names,
+        "cas_index": cas_index,
+    }
+    # Written next to the CSV and renamed into place, so concurrent readers
+    # see either the old file or the complete new one
+    path = artifact_path(csv_path)
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path) or ".",
+                                         prefix=os.path.basename(path), suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write FDA Food Substances index: %s", e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return FoodSubstanceIndex(records, names, cas_index)
+
+
+def load_food_substance_index(csv_path):
+    """Load the pickled index, rebuilding it when it is missing or older than the CSV"""
+    try:
+        with open(artifact_path(csv_path), "rb") as f:
+            payload = pickle.load(f)
+        if (
+            payload.get("version") == ARTIFACT_VERSION
+            and payload.get("source_mtime_ns") == os.stat(csv_path).st_mtime_ns
+        ):
+            records = [FoodSubstance(*record) for record in payload["records"]]
+            return FoodSubstanceIndex(records, payload["names"], payload["cas_index"])
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError, ValueError,
+            AttributeError, ImportError):
+        # Missing, from an older version, or left truncated by a writer that died
+        pass
+    return build_food_substance_index(csv_path)
+
+
+if __name__ == "__main__":
+    from reference_data import DATA_DIR, REFERENCE_FILES
+
+    logging.basicConfig(level=logging.INFO)
+
+    index = build_food_substance_index(os.path.join(DATA_DIR, REFERENCE_FILES["fda_substances"]))
+    print(f"Indexed {len(index)} substances under {len(index.names)} names")
+    for name in ["gum arabic", "ACESULFAME K", "Citric acid", "cinnamyl anthranilate"]:
+        substance = index.find(name)
+        print(name, "->", substance and index.message(substance))
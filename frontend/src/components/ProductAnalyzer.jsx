@@ -372,6 +372,38 @@ const saveToRecents = (productName, analysisData) => {
   localStorage.setItem(key, JSON.stringify(data))
 }
 
+// Read an NDJSON response line by line, calling onEvent for each parsed event
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop()
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line))
+    }
+  }
+  if (buffer.trim()) onEvent(JSON.parse(buffer))
+}
+
+// Merge one streamed partial result into the result shown so far
+const mergePartialResult = (previous, { key, value }) => {
+  const next = { ...(previous || {}) }
+  if (key === 'product_name' || key === 'analysis') {
+    next[key] = value
+  } else if (key === 'extracted_data') {
+    next.extracted_data = { ...(previous?.extracted_data || {}), ...value }
+  } else {
+    next.extracted_data = { ...(previous?.extracted_data || {}), [key]: value }
+  }
+  return next
+}
+
 function ProductAnalyzer({
   result,
   setResult,
@@ -599,18 +631,20 @@ function ProductAnalyzer({
     e.preventDefault()
     setLoading(true)
     setError(null)
+    setResult(null)
 
     try {
       let response;
       const API_URL = "http://127.0.0.1:5000"
 
+      // stream=1: the backend sends each part of the result as NDJSON as soon as it is ready
       if (uploadType === 'url') {
-        response = await fetch(`${API_URL}/api/analyze`, {
+        response = await fetch(`${API_URL}/api/analyze?stream=1`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
             'Origin': 'https://foodxray.netlify.app',
-            'Accept': 'application/json',
+            'Accept': 'application/x-ndjson, application/json',
           },
           credentials: 'omit',
           body: JSON.stringify({ url }),
@@ -619,21 +653,32 @@ function ProductAnalyzer({
         const formData = new FormData();
         formData.append('image', selectedFile);
 
-        response = await fetch(`${API_URL}/api/analyze`, {
+        response = await fetch(`${API_URL}/api/analyze?stream=1`, {
           method: 'POST',
           headers: {
             'Origin': 'https://foodxray.netlify.app',
-            'Accept': 'application/json',
+            'Accept': 'application/x-ndjson, application/json',
           },
           credentials: 'omit',
           body: formData,
         });
       }
 
-      const data = await response.json()
+      let data
+      if (response.headers.get('Content-Type')?.includes('application/x-ndjson')) {
+        await readEventStream(response, (event) => {
+          if (event.event === 'partial') {
+            setResult(previous => mergePartialResult(previous, event))
+          } else if (event.event === 'done' || event.event === 'failed') {
+            data = event.result
+          }
+        })
+      } else {
+        data = await response.json()
+      }
 
-      if (!data.success) {
-        throw new Error(data.error)
+      if (!data?.success) {
+        throw new Error(data?.error || 'Analysis failed')
       }
 
       setResult(data.data)
@@ -1375,7 +1420,14 @@ function ProductAnalyzer({
             </CardContent>
           </Card>
         )
-      )
+      ) || (loading && (
+        <Box sx={{ display: 'flex', alignItems: 'center', justifyContent: 'center', gap: 1.5, py: 4 }}>
+          <CircularProgress size={20} />
+          <Typography variant="body2" color="text.secondary">
+            Analyzing nutritional data...
+          </Typography>
+        </Box>
+      ))
     },
     {
       value: 'safety',
@@ -1643,8 +1695,8 @@ function ProductAnalyzer({
             </Alert>
           )}
 
-          {/* Results */}
-          {loading ? (
+          {/* Results: shown as soon as the extracted data has streamed in */}
+          {loading && !result?.extracted_data ? (
             <LoadingAnimation />
           ) : (
             result && (
@@ -1,50 +1,325 @@
 import pprint
 from dotenv import load_dotenv
 import os
+import re
 import asyncio
+import atexit
+import json
+import logging
+import random
+import threading
 import aiohttp
-from urllib.parse import quote
+from concurrent.futures import Future
+
+from cache import CACHE_DIR, SqliteCache
+import metrics
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GOOGLE_CUSTOM_SEARCH_API_KEY = os.getenv("GOOGLE_CUSTOM_SEARCH_API_KEY_2")
 GOOGLE_CUSTOM_SEARCH_ENGINE_ID = os.getenv("GOOGLE_CUSTOM_SEARCH_ENGINE_ID_2")
 
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))
+SEARCH_CALL_TIMEOUT = float(os.getenv("SEARCH_CALL_TIMEOUT", "8"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "20"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "3"))
+
+
+class RetryableSearchError(Exception):
+    """A 429 or 5xx answer; ``retry_after`` is the server's hint in seconds, if any"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Ingredient -> search results, shared by every request and process
+search_cache = SqliteCache(
+    os.getenv("SEARCH_CACHE_PATH", os.path.join(CACHE_DIR, "searches.sqlite3")),
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "50000")),
+)
+
+# Normalized ingredient -> Future for searches currently running in any thread
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_coalesced = 0
+_fetch_tasks = set()
 
-async def search_ingredient(session, ingredient):
+_PERCENTAGE = re.compile(r"\(?\s*\d+(?:\.\d+)?\s*%\s*\)?")
+# "(330)", "(E330)", "(INS 330)", "(322, 471)", "(500(ii), 503(ii))", "(202 & 282)", "(150d 102)".
+# Codes must be separated by a comma, "&", "/", "and" or whitespace, so that
+# an unclosed list can only be split one way and fails in linear time
+_E_NUMBER = r"(?:(?:e|ins)\s*)?\d{3,4}[a-z]?(?:\s*\([ivx]+\))?"
+_E_NUMBERS = re.compile(
+    rf"\(\s*{_E_NUMBER}(?:(?:\s*(?:[,&/]|and)\s*|\s+){_E_NUMBER})*(?:\s*[,&/])?\s*\)"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class SearchResults(dict):
     """
-    Perform async search for a single ingredient
+    ``{ingredient: [result, ...]}``, plus ``missing``: the ingredients whose
+    search did not finish, so their empty list means "unknown" rather than
+    "no results".
     """
-    try:
-        # Construct the API URL
-        query = quote(f"{ingredient} health analysis")
-        url = f"https://www.googleapis.com/customsearch/v1"
-        params = {
-            "key": GOOGLE_CUSTOM_SEARCH_API_KEY,
-            "cx": GOOGLE_CUSTOM_SEARCH_ENGINE_ID,
-            "q": f"{ingredient} health analysis",
-            "num": 10,
-        }
 
+    def __init__(self, results=(), missing=()):
+        super().__init__(results)
+        self.missing = frozenset(missing)
+
+    @property
+    def complete(self):
+        return not self.missing
+
+
+class SearchCancelled(Exception):
+    """The shared fetch another request was waiting on was cancelled"""
+
+
+def normalize_ingredient_key(ingredient):
+    """
+    Reduce an ingredient to the text worth searching for: case-folded, with
+    percentages and E-number/INS parentheticals removed, e.g.
+    "ACIDITY REGULATOR (330)" -> "acidity regulator".
+    """
+    key = (ingredient or "").casefold()
+    key = _PERCENTAGE.sub(" ", key)
+    key = _E_NUMBERS.sub(" ", key)
+    key = _WHITESPACE.sub(" ", key).strip(" ,.;:-")
+    # An ingredient that is only a code, e.g. "(330)", is searched as-is
+    return key or _WHITESPACE.sub(" ", (ingredient or "").casefold()).strip()
+
+
+async def fetch_search_results(session, ingredient):
+    """
+    Query the Custom Search API for one ingredient. Raises on failure so
+    that errors are never cached.
+    """
+    url = "https://www.googleapis.com/customsearch/v1"
+    params = {
+        "key": GOOGLE_CUSTOM_SEARCH_API_KEY,
+        "cx": GOOGLE_CUSTOM_SEARCH_ENGINE_ID,
+        "q": f"{ingredient} health analysis",
+        "num": 10,
+    }
+
+    with metrics.provider_call("google_search") as call:
         async with session.get(url, params=params) as response:
-            data = await response.json()
-
-            # Extract relevant information from search results
-            search_results = []
-            for item in data.get("items", []):
-                search_results.append(
-                    {
-                        "title": item.get("title"),
-                        "snippet": item.get("snippet"),
-                        "link": item.get("link"),
-                    }
+            if response.status == 429 or response.status >= 500:
+                retry_after = response.headers.get("Retry-After")
+                raise RetryableSearchError(
+                    f"Custom Search API returned {response.status}",
+                    float(retry_after) if retry_after and retry_after.isdigit() else None,
                 )
+            body = await response.read()
+            call.add(bytes=len(body))
+        data = json.loads(body)
 
-            return ingredient, search_results
+    if "error" in data:
+        raise RuntimeError(data["error"].get("message", "Custom Search API error"))
 
+    # Extract relevant information from search results
+    search_results = []
+    for item in data.get("items", []):
+        search_results.append(
+            {
+                "title": item.get("title"),
+                "snippet": item.get("snippet"),
+                "link": item.get("link"),
+            }
+        )
+    return search_results
+
+
+def start_shared_fetch(fetch, key):
+    """
+    Return the Future of the fetch for a normalized ``key``, starting
+    ``fetch(key)`` as a task of its own unless one is already in flight.
+    The fetch is owned by no request: it runs to completion (and fills
+    ``search_cache``) even if every request waiting on it gives up. Must be
+    called on the event loop.
+    """
+    global _coalesced
+
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            _coalesced += 1
+            return future
+        future = _in_flight[key] = Future()
+    task = asyncio.ensure_future(_run_shared_fetch(fetch, key, future))
+    # The loop only keeps weak references to tasks
+    _fetch_tasks.add(task)
+    task.add_done_callback(_fetch_tasks.discard)
+    return future
+
+
+async def _run_shared_fetch(fetch, key, future):
+    try:
+        results = await fetch(key)
+        search_cache.set(key, results)
+        future.set_result(results)
     except Exception as e:
-        print(f"Error searching for {ingredient}: {str(e)}")
-        return ingredient, []
+        logger.warning("Error searching for %s: %s", key, e)
+        future.set_exception(e)
+    except BaseException:
+        # Only happens when the loop shuts down; waiters see an ordinary failure
+        future.set_exception(SearchCancelled(f"Search for {key} was cancelled"))
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+async def cached_search_ingredient(fetch, ingredient):
+    """
+    Search for an ingredient through ``search_cache``, calling ``fetch(query)``
+    on a miss. Ingredients that normalize to the same key share one cache
+    entry, and concurrent requests for a key that is already being fetched
+    wait for that fetch instead of starting their own. Raises if the fetch
+    failed.
+    """
+    key = normalize_ingredient_key(ingredient)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return ingredient, cached
+
+    future = start_shared_fetch(fetch, key)
+    # shield: this caller giving up (its deadline) must not cancel the shared fetch
+    return ingredient, await asyncio.shield(asyncio.wrap_future(future))
+
+
+def search_cache_stats():
+    """Hit/miss counters of the ingredient search cache"""
+    stats = search_cache.stats()
+    stats["coalesced"] = _coalesced
+    return stats
+
+
+class SearchClient:
+    """
+    Long-lived Custom Search client shared by all requests.
+
+    It owns one event loop on a background thread and one connection-pooled
+    aiohttp session on that loop. At most ``concurrency`` API calls run at
+    once, each bounded by ``call_timeout``; 429 and 5xx answers are retried
+    with exponential backoff (or the server's Retry-After). ``search_many``
+    stops waiting at ``deadline`` and returns what it has as SearchResults,
+    with an empty result list for ingredients that did not finish or
+    failed. Fetches cut off by a deadline keep running and fill the cache.
+    """
+
+    def __init__(self, concurrency=SEARCH_CONCURRENCY, call_timeout=SEARCH_CALL_TIMEOUT,
+                 deadline=SEARCH_DEADLINE, max_retries=SEARCH_MAX_RETRIES):
+        self.concurrency = concurrency
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="google-search", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._loop = loop
+            atexit.register(self.close)
+
+    async def _open(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.call_timeout),
+        )
+
+    async def fetch(self, query):
+        """Fetch results for one query, retrying rate limits and transient failures"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await fetch_search_results(self._session, query)
+            except (RetryableSearchError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = getattr(e, "retry_after", None) or (0.5 * 2 ** attempt)
+                logger.info("Retrying search for %s in %.1fs: %s", query, delay, str(e) or type(e).__name__)
+                await asyncio.sleep(delay + random.uniform(0, 0.25))
+
+    async def _search_many(self, ingredients, deadline):
+        tasks = {
+            ingredient: asyncio.ensure_future(cached_search_ingredient(self.fetch, ingredient))
+            for ingredient in dict.fromkeys(ingredients)
+        }
+        if not tasks:
+            return SearchResults()
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            # Stops this request waiting; the shared fetches keep running
+            task.cancel()
+        if pending:
+            logger.warning("Search deadline of %ss reached; %d ingredient(s) without results", deadline, len(pending))
+
+        # Failures were logged by the fetch; they count as missing like timeouts
+        finished = {task for task in done if not task.cancelled() and task.exception() is None}
+        return SearchResults(
+            {ingredient: task.result()[1] if task in finished else [] for ingredient, task in tasks.items()},
+            missing=[ingredient for ingredient, task in tasks.items() if task not in finished],
+        )
+
+    def submit(self, ingredients, deadline=None):
+        """Start searching on the client's loop; returns a concurrent.futures.Future of the result dict"""
+        self._start()
+        return asyncio.run_coroutine_threadsafe(
+            self._search_many(list(ingredients), deadline or self.deadline), self._loop
+        )
+
+    def search_many(self, ingredients, deadline=None):
+        return self.submit(ingredients, deadline).result()
+
+    def prefetch(self, ingredients):
+        """
+        Start fetching ``ingredients`` that are neither cached nor in flight
+        and return at once. Nothing waits on these fetches, so no deadline
+        cuts them off; a later search joins them or finds them cached.
+        """
+        self._start()
+        self._loop.call_soon_threadsafe(self._prefetch, list(ingredients))
+
+    def _prefetch(self, ingredients):
+        for ingredient in ingredients:
+            key = normalize_ingredient_key(ingredient)
+            with _in_flight_lock:
+                in_flight = key in _in_flight
+            if key and not in_flight and search_cache.get(key) is None:
+                start_shared_fetch(self.fetch, key)
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+search_client = SearchClient()
+
+
+def prefetch_search(ingredient):
+    """
+    Start searching for one ingredient in the background. A later search
+    for the same ingredient joins this fetch or finds its result cached.
+    """
+    if isinstance(ingredient, str) and ingredient.strip():
+        search_client.prefetch([ingredient])
 
 
 async def analyze_google(ingredients):
@@ -57,15 +332,7 @@ async def analyze_google(ingredients):
     Returns:
         dict: Dictionary with ingredients as keys and their search results as values
     """
-    async with aiohttp.ClientSession() as session:
-        # Create tasks for all ingredients
-        tasks = [search_ingredient(session, ingredient) for ingredient in ingredients]
-
-        # Wait for all tasks to complete
-        results = await asyncio.gather(*tasks)
-
-        # Convert results to dictionary
-        return dict(results)
+    return await asyncio.wrap_future(search_client.submit(ingredients))
 
 
 # Helper function to run async code from sync context
@@ -73,10 +340,11 @@ def analyze_google_sync(ingredients):
     """
     Synchronous wrapper for analyze_google
     """
-    return asyncio.run(analyze_google(ingredients))
+    return search_client.search_many(ingredients)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
     ingredients = ["sugar"]
     results = analyze_google_sync(ingredients)
     pprint.pprint(results)
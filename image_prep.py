@@ -0,0 +1,89 @@
+"""
+Preparation of label images before they are sent to Gemini.
+
+Given a PIL image without a source file, the Gemini SDK uploads it as
+lossless WebP at full resolution. ``prepare_images`` instead caps the long
+edge, re-encodes to a compact lossy format without metadata and returns
+ready-to-send blobs. It can also drop carousel images that are unlikely to
+contain any text (plain product shots), judged by their edge density.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from io import BytesIO
+
+import PIL.Image
+import PIL.ImageFilter
+import PIL.ImageOps
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@dataclass(frozen=True)
+class ImagePrepConfig:
+    max_edge: int = 1600
+    format: str = "JPEG"
+    quality: int = 85
+    drop_textless: bool = False
+    min_edge_density: float = 0.04
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_edge=int(os.getenv("IMAGE_MAX_EDGE", cls.max_edge)),
+            format=os.getenv("IMAGE_FORMAT", cls.format).upper(),
+            quality=int(os.getenv("IMAGE_QUALITY", cls.quality)),
+            drop_textless=os.getenv("IMAGE_DROP_TEXTLESS", "0") == "1",
+            min_edge_density=float(os.getenv("IMAGE_MIN_EDGE_DENSITY", cls.min_edge_density)),
+        )
+
+
+def _to_rgb(image):
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = PIL.Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def edge_density(image, sample_edge=256, threshold=48):
+    """Fraction of pixels on a strong edge in a small grayscale copy; text scores high"""
+    sample = image.convert("L")
+    sample.thumbnail((sample_edge, sample_edge))
+    edges = sample.filter(PIL.ImageFilter.FIND_EDGES)
+    histogram = edges.histogram()
+    return sum(histogram[threshold:]) / max(1, sample.width * sample.height)
+
+
+def prepare_image(image, config):
+    """Resize and re-encode one image; returns a Gemini blob dict"""
+    # The EXIF orientation tag is dropped below, so rotate the pixels upright first
+    image = _to_rgb(PIL.ImageOps.exif_transpose(image))
+    if max(image.size) > config.max_edge:
+        image = image.copy()
+        image.thumbnail((config.max_edge, config.max_edge), PIL.Image.LANCZOS)
+
+    buffer = BytesIO()
+    if config.format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        # Nothing from image.info is passed on, so EXIF and other metadata are dropped
+        image.save(buffer, format=config.format, quality=config.quality)
+    return {"mime_type": MIME_TYPES[config.format], "data": buffer.getvalue()}
+
+
+def prepare_images(images, config):
+    """
+    Prepare an image set for the extraction call. With ``drop_textless`` set,
+    images below ``min_edge_density`` are skipped unless that would leave
+    nothing to send.
+    """
+    if config.drop_textless:
+        kept = [image for image in images if edge_density(image) >= config.min_edge_density]
+        if kept and len(kept) < len(images):
+            logger.info("Skipping %d image(s) without visible text", len(images) - len(kept))
+            images = kept
+    return [prepare_image(image, config) for image in images]
@@ -0,0 +1,146 @@
+"""
+Incremental parsing of the streamed extraction response.
+
+Gemini streams the extraction JSON in chunks of a few dozen to a few hundred
+characters, often wrapped in a ```json fence. ``IngredientStreamParser``
+scans each chunk as it arrives and hands back every element of the
+top-level "ingredients" array the moment its closing quote (or bracket) is
+seen, so work on the first ingredients can start while the rest of the
+response is still being generated. The whole document is parsed once at
+the end as before.
+"""
+import json
+import re
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class IngredientStreamParser:
+    """
+    Feed response chunks with ``feed``, which returns the ingredients
+    completed by that chunk; call ``result`` after the last chunk for the
+    full document. Anything before the first "{" and after the matching
+    "}" (code fences, stray prose) is ignored.
+    """
+
+    def __init__(self, array_key="ingredients"):
+        self.array_key = array_key
+        self.ingredients = []
+        self._text = ""
+        self._pos = 0
+        self._start = None
+        self._end = None
+        self._stack = []
+        self._in_string = False
+        self._string_start = None
+        self._expect_key = False
+        self._key = None
+        self._array_depth = None
+        self._item_start = None
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def complete(self):
+        return self._end is not None
+
+    def feed(self, chunk):
+        self._text += chunk
+        found = []
+        self._scan(found)
+        return found
+
+    def _emit(self, raw, found):
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            return
+        self.ingredients.append(item)
+        found.append(item)
+
+    def _scan(self, found):
+        text = self._text
+        n = len(text)
+        i = self._pos
+        if self._start is None:
+            i = text.find("{", i)
+            if i < 0:
+                self._pos = n
+                return
+            self._start = i
+
+        stack = self._stack
+        while i < n and self._end is None:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    i = n
+                    break
+                j = match.start()
+                if text[j] == "\\":
+                    if j + 1 >= n:
+                        # The escaped character is in the next chunk
+                        i = j
+                        break
+                    i = j + 2
+                    continue
+                i = j + 1
+                self._in_string = False
+                self._string_closed(text, i, found)
+                continue
+
+            char = text[i]
+            in_array = self._array_depth is not None and len(stack) == self._array_depth
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                if in_array and self._item_start is None:
+                    self._item_start = i
+            elif char in "{[":
+                if in_array and self._item_start is None:
+                    self._item_start = i
+                stack.append(char)
+                if char == "[" and len(stack) == 2 and self._key == self.array_key:
+                    self._array_depth = 2
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if in_array:
+                    # End of the array; a pending number/literal item ends here
+                    if self._item_start is not None:
+                        self._emit(text[self._item_start:i], found)
+                        self._item_start = None
+                    self._array_depth = None
+                stack.pop()
+                if not stack:
+                    self._end = i + 1
+                elif self._array_depth is not None and len(stack) == self._array_depth:
+                    self._emit(text[self._item_start:i + 1], found)
+                    self._item_start = None
+            elif char == ",":
+                if in_array and self._item_start is not None:
+                    self._emit(text[self._item_start:i], found)
+                    self._item_start = None
+                self._expect_key = stack[-1] == "{"
+            elif char == ":":
+                self._expect_key = False
+            elif in_array and self._item_start is None and not char.isspace():
+                self._item_start = i
+            i += 1
+        self._pos = i
+
+    def _string_closed(self, text, end, found):
+        stack = self._stack
+        if len(stack) == 1 and self._expect_key:
+            self._key = json.loads(text[self._string_start:end])
+        elif (self._array_depth is not None and len(stack) == self._array_depth
+              and self._item_start == self._string_start):
+            self._emit(text[self._item_start:end], found)
+            self._item_start = None
+
+    def result(self):
+        """Parse the whole response; raises ValueError if it is not valid JSON"""
+        if self._end is not None:
+            return json.loads(self._text[self._start:self._end])
+        return json.loads(self._text.strip().strip("```json").strip())
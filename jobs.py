@@ -0,0 +1,120 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    One submitted analysis. ``events`` is an append-only list of progress
+    events; readers wait on the job's condition for new ones.
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def add_event(self, event, **data):
+        with self._cond:
+            self.events.append({"event": event, **data})
+            self._cond.notify_all()
+
+    def finish(self, result):
+        with self._cond:
+            self.result = result
+            self.status = "done" if result.get("success") else "failed"
+            self.finished_at = time.time()
+            self.events.append({"event": self.status})
+            self._cond.notify_all()
+
+    def wait_for_events(self, since, timeout=15):
+        """Return the events after index ``since``, waiting up to ``timeout`` seconds for one"""
+        with self._cond:
+            if len(self.events) <= since and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stages": [event["stage"] for event in self.events if event["event"] == "stage"],
+                "result": self.result,
+            }
+
+
+class JobManager:
+    """
+    Runs analyses on a bounded worker pool, outside of the web request.
+
+    Submitting a job whose key matches one that is still queued or running
+    returns the existing job instead of starting another. At most
+    ``max_queued`` unfinished jobs are accepted; finished jobs are kept for
+    ``retention`` seconds so clients can collect the result.
+    """
+
+    def __init__(self, workers=4, max_queued=100, retention=3600):
+        self.max_queued = max_queued
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, key, fn):
+        """
+        Queue ``fn(job)`` unless an unfinished job with the same key exists.
+        ``fn`` returns the analysis result dict and may call ``job.add_event``
+        to report progress.
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None and not job.finished:
+                return job
+
+            self._prune()
+            if sum(not job.finished for job in self._jobs.values()) >= self.max_queued:
+                raise JobQueueFull("Too many analyses in progress, try again later")
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.add_event("running")
+        try:
+            result = fn(job)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        job.finish(result)
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
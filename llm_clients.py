@@ -0,0 +1,113 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from google.api_core import retry as api_retry
+from mistralai import Mistral
+from mistralai.utils import BackoffStrategy, RetryConfig
+
+import metrics
+
+load_dotenv()
+
+GEMINI_MODEL = "gemini-1.5-pro"
+MISTRAL_MODEL = "mistral-large-latest"
+
+# Per-call timeouts, total time allowed for retries of one call, and how many
+# calls may be in flight at once, per provider
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+GEMINI_RETRY_BUDGET = float(os.getenv("GEMINI_RETRY_BUDGET", "60"))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+MISTRAL_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "120"))
+MISTRAL_RETRY_BUDGET = float(os.getenv("MISTRAL_RETRY_BUDGET", "60"))
+MISTRAL_CONCURRENCY = int(os.getenv("MISTRAL_CONCURRENCY", "4"))
+
+
+class LLMClients:
+    """
+    Process-wide Gemini and Mistral clients.
+
+    Each client is created on first use and then shared by every request and
+    thread, so its connections stay open between analyses. Calls go through
+    ``generate_content`` / ``chat_complete``, which apply the configured
+    timeout and retry budget and hold one of the provider's concurrency
+    slots for the duration of the call. Every call is timed and counted
+    under its provider in ``metrics``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gemini_configured = False
+        self._gemini_models = {}
+        self._mistral = None
+        self._slots = {
+            "gemini": threading.BoundedSemaphore(GEMINI_CONCURRENCY),
+            "mistral": threading.BoundedSemaphore(MISTRAL_CONCURRENCY),
+        }
+        self._gemini_retry = api_retry.Retry(
+            predicate=api_retry.if_transient_error,
+            initial=1.0,
+            maximum=10.0,
+            multiplier=2.0,
+            timeout=GEMINI_RETRY_BUDGET,
+        )
+
+    def gemini(self, model_name=GEMINI_MODEL):
+        with self._lock:
+            if not self._gemini_configured:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY_2"))
+                self._gemini_configured = True
+            if model_name not in self._gemini_models:
+                self._gemini_models[model_name] = genai.GenerativeModel(model_name)
+            return self._gemini_models[model_name]
+
+    def mistral(self):
+        with self._lock:
+            if self._mistral is None:
+                self._mistral = Mistral(
+                    api_key=os.getenv("MISTRAL_API_KEY"),
+                    timeout_ms=int(MISTRAL_TIMEOUT * 1000),
+                    retry_config=RetryConfig(
+                        "backoff",
+                        BackoffStrategy(500, 10000, 2.0, int(MISTRAL_RETRY_BUDGET * 1000)),
+                        True,
+                    ),
+                )
+            return self._mistral
+
+    @contextmanager
+    def slot(self, provider):
+        """Hold one of ``provider``'s concurrency slots for a ``with`` block"""
+        with self._slots[provider]:
+            yield
+
+    def generate_content(self, contents, model_name=GEMINI_MODEL):
+        model = self.gemini(model_name)
+        with self.slot("gemini"), metrics.provider_call("gemini"):
+            return model.generate_content(
+                contents,
+                request_options={"timeout": GEMINI_TIMEOUT, "retry": self._gemini_retry},
+            )
+
+    def stream_content(self, contents, model_name=GEMINI_MODEL):
+        """Streaming ``generate_content``: yields the text of each chunk as it arrives"""
+        model = self.gemini(model_name)
+        with self.slot("gemini"), metrics.provider_call("gemini") as call:
+            response = model.generate_content(
+                contents,
+                stream=True,
+                request_options={"timeout": GEMINI_TIMEOUT, "retry": self._gemini_retry},
+            )
+            for chunk in response:
+                call.add(bytes=len(chunk.text.encode()))
+                yield chunk.text
+
+    def chat_complete(self, **kwargs):
+        client = self.mistral()
+        with self.slot("mistral"), metrics.provider_call("mistral"):
+            return client.chat.complete(**kwargs)
+
+
+llm_clients = LLMClients()
@@ -0,0 +1,164 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /api/metrics.
+
+``span(stage)`` times a pipeline stage and counts how it failed; code
+running inside it can attach item and byte counts with ``add``.
+``provider_call(provider)`` does the same for one call to an external
+service, and ``record_cache`` counts cache hits and misses. Everything is
+aggregated in memory since process start; nothing is kept per request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [per-bucket counts, total count, sum]
+                series = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, count, total) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = _labels(self.labelnames, labels, [("le", f"{bound:g}")])
+                    lines.append(f"{self.name}_bucket{le} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("foodlabel_stage_duration_seconds", "Time spent in each analysis stage", ["stage"])
+STAGE_ERRORS = Counter("foodlabel_stage_errors_total", "Analysis stages that raised, by exception type", ["stage", "error"])
+STAGE_ITEMS = Counter("foodlabel_stage_items_total", "Items (images, ingredients, ...) handled per stage", ["stage"])
+STAGE_BYTES = Counter("foodlabel_stage_bytes_total", "Bytes downloaded or uploaded per stage", ["stage"])
+PROVIDER_SECONDS = Histogram("foodlabel_provider_request_duration_seconds", "Duration of calls to external services", ["provider"])
+PROVIDER_BYTES = Counter("foodlabel_provider_bytes_total", "Bytes received from external services", ["provider"])
+PROVIDER_ERRORS = Counter("foodlabel_provider_errors_total", "Failed calls to external services, by exception type", ["provider", "error"])
+CACHE_LOOKUPS = Counter("foodlabel_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+
+REGISTRY = [
+    STAGE_SECONDS, STAGE_ERRORS, STAGE_ITEMS, STAGE_BYTES,
+    PROVIDER_SECONDS, PROVIDER_BYTES, PROVIDER_ERRORS, CACHE_LOOKUPS,
+]
+
+_current = threading.local()
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+
+    def add(self, items=0, bytes=0):
+        self.items += items
+        self.bytes += bytes
+
+
+@contextmanager
+def span(stage):
+    """Time a stage; ``add`` calls made inside it on this thread are attributed to it"""
+    current = Span(stage)
+    parent = getattr(_current, "span", None)
+    _current.span = current
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage, type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+        _current.span = parent
+        if current.items:
+            STAGE_ITEMS.inc(stage, amount=current.items)
+        if current.bytes:
+            STAGE_BYTES.inc(stage, amount=current.bytes)
+
+
+def add(items=0, bytes=0):
+    """Attribute item/byte counts to the innermost span open on this thread, if any"""
+    current = getattr(_current, "span", None)
+    if current is not None:
+        current.add(items=items, bytes=bytes)
+
+
+@contextmanager
+def provider_call(provider):
+    """Time one call to an external service and count it if it fails; ``add(bytes=...)`` records the response size"""
+    call = Span(provider)
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException as e:
+        PROVIDER_ERRORS.inc(provider, type(e).__name__)
+        raise
+    finally:
+        PROVIDER_SECONDS.observe(time.perf_counter() - start, provider)
+        if call.bytes:
+            PROVIDER_BYTES.inc(provider, amount=call.bytes)
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss")
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,253 @@
+"""
+Local nutrition scoring against the FDA daily values in ``daily_values``.
+
+Label keys are mapped to canonical nutrients by ``NutrientResolver``,
+which knows every spelling in the alternate-name table and tolerates small
+typos; amounts are parsed with their units (g/mg/mcg, kcal/kJ, with or
+without a DFE/NE/RAE suffix) and each nutrient gets its %DV and a
+high/low level using the FDA thresholds (20% and above is high, 5% and
+below is low). The %DV is for the quantity the label states, which for
+most Indian labels is per 100 g. Salt is scored as the sodium it
+contains; total sugars are recognised but have no daily value (only added
+sugars do).
+
+``score_labels`` works on many labels at once with whole-column pandas
+operations, so batch jobs can score thousands of labels per second;
+``nutrition_summary`` is the single-label form added to API responses.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from daily_values import fda_daily_values
+
+HIGH_PERCENT_DV = 20
+LOW_PERCENT_DV = 5
+
+# The amount must be a whole number (no backtracking into its digits), and
+# a unit may carry a DFE/NE/RAE suffix: "400mcg DFE", "16mgNE"
+AMOUNT_PATTERN = (
+    r"(?<![\d.])(?P<amount>\d+(?:\.\d+)?)(?![\d.])\s*"
+    r"(?P<unit>kcal|kj|cal|mcg|µg|μg|ug|mg|grams?|gms?|g)?(?:\s*(?:dfe|ne|rae))?(?![a-z])"
+)
+KEY_UNIT_PATTERN = r"\((?P<unit>kcal|kj|cal|mcg|µg|μg|ug|mg|grams?|gms?|g)\)"
+
+UNIT_ALIASES = {
+    "g": "g", "gm": "g", "gms": "g", "gram": "g", "grams": "g",
+    "mg": "mg",
+    "mcg": "mcg", "µg": "mcg", "μg": "mcg", "ug": "mcg",
+    "kcal": "kcal", "cal": "kcal",
+    "kj": "kj",
+}
+# Nutrients labels state that are not in the daily value table: salt is
+# scored as sodium (39.3% of its mass), total sugars are left unscored
+LABEL_NUTRIENTS = [
+    {"name": "Salt", "alternate_names": ["Sodium chloride"]},
+    {"name": "Sugars", "alternate_names": ["Sugar", "Total sugars", "Total sugar"]},
+]
+SCORED_AS = {"Salt": ("Sodium", 0.393)}
+
+# Mass is compared in grams, energy in kcal
+UNIT_FACTORS = {"g": 1.0, "mg": 1e-3, "mcg": 1e-6, "kcal": 1.0, "kj": 1 / 4.184}
+UNIT_DIMENSIONS = {"g": "mass", "mg": "mass", "mcg": "mass", "kcal": "energy", "kj": "energy"}
+
+
+# Words that never tell nutrients apart ("Total Fat", "of which Sugars", "Energy per 100g")
+FILLER_WORDS = frozenset({
+    "total", "of", "which", "incl", "including", "dietary", "content", "amount", "value", "per",
+    "g", "gm", "mg", "mcg", "ug", "kcal", "kj", "cal",
+})
+
+_PARENTHETICAL = re.compile(r"\(.*?\)|\[.*?\]")
+_HYPHEN = re.compile(r"(?<=\w)-(?=\w)")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_SPLIT_CODE = re.compile(r"\b([a-z]) (\d+)\b")
+_QUANTITY = re.compile(r"\d+(?:g|ml)")
+# "0,5" is a decimal comma; "1,234" and "12,500" are thousands separators
+_LEADING_ZERO_COMMA = r"(?<!\d)0,(?=\d)"
+_THOUSANDS_COMMA = r"(?<=\d),(?=\d{3}(?!\d))"
+
+
+def nutrient_tokens(key):
+    """Label key -> tuple of meaningful lowercase tokens, e.g. "Total Fat (g)" -> ("fat",)"""
+    text = _HYPHEN.sub("", _PARENTHETICAL.sub(" ", str(key).lower()))
+    # "Vitamin B 12" -> "vitamin b12"
+    text = _SPLIT_CODE.sub(r"\1\2", _NON_WORD.sub(" ", text))
+    return tuple(
+        token for token in text.split()
+        if token not in FILLER_WORDS and not _QUANTITY.fullmatch(token)
+    )
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (adjacent transpositions count as one
+    edit), or ``limit + 1`` as soon as it is certain to exceed ``limit``
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = char_a != char_b
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _token_limit(token):
+    """Typos tolerated in one token; short ones such as symbols must match exactly"""
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 12 else 2
+
+
+class NutrientResolver:
+    """
+    Label key -> canonical nutrient name.
+
+    Every name and alternate name in the table is reduced to its tokens once,
+    up front. Known spellings are then a dict probe, first on the tokens in
+    order and then on the sorted tokens ("fatty acids, saturated"). Anything
+    else falls back to a bounded, per-token edit distance against the known
+    spellings with the same number of tokens, so "Protien" or "Carbohydrte"
+    resolve but "Unsaturated fat" does not turn into saturated fat. Fuzzy
+    results, including misses, are cached.
+    """
+
+    def __init__(self, nutrients, fuzzy_cache_size=4096):
+        self.exact = {}
+        self.unordered = {}
+        # The first spelling wins, so a nutrient's own name beats another's alternate
+        for nutrient in nutrients:
+            for name in [nutrient["name"]] + nutrient["alternate_names"]:
+                tokens = nutrient_tokens(name)
+                if tokens:
+                    self.exact.setdefault(" ".join(tokens), nutrient["name"])
+                    self.unordered.setdefault(tuple(sorted(tokens)), nutrient["name"])
+
+        self._by_length = {}
+        for tokens, name in self.unordered.items():
+            self._by_length.setdefault(len(tokens), []).append((tokens, name))
+        self.resolve_fuzzy = lru_cache(maxsize=fuzzy_cache_size)(self._resolve_fuzzy)
+
+    def _resolve_fuzzy(self, tokens):
+        best, best_distance = None, None
+        for candidate, name in self._by_length.get(len(tokens), ()):
+            distance = 0
+            for token, known in zip(tokens, candidate):
+                limit = _token_limit(token)
+                token_distance = edit_distance(token, known, limit)
+                if token_distance > limit:
+                    break
+                distance += token_distance
+            else:
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = name, distance
+        return best
+
+    def resolve(self, key):
+        """Canonical nutrient name for a label key, or None"""
+        tokens = nutrient_tokens(key)
+        if not tokens:
+            return None
+        name = self.exact.get(" ".join(tokens))
+        if name is None:
+            sorted_tokens = tuple(sorted(tokens))
+            name = self.unordered.get(sorted_tokens)
+            if name is None:
+                name = self.resolve_fuzzy(sorted_tokens)
+        return name
+
+
+def parse_amounts(values):
+    """Split strings like "26.5 g", "2,5 g", "1,234 mg" or "405kcal" into (amount, unit) columns"""
+    parsed = (
+        pd.Series(values, dtype=object)
+        .str.lower()
+        .str.replace(_LEADING_ZERO_COMMA, "0.", regex=True)
+        .str.replace(_THOUSANDS_COMMA, "", regex=True)
+        .str.replace(",", ".", regex=False)
+        .str.extract(AMOUNT_PATTERN)
+    )
+    return pd.to_numeric(parsed["amount"]), parsed["unit"].map(UNIT_ALIASES)
+
+
+def _daily_values(nutrients):
+    """Canonical name -> (daily value in grams or kcal, "mass"/"energy")"""
+    amounts, units = parse_amounts([nutrient["daily_value"] for nutrient in nutrients])
+    return {
+        nutrient["name"]: (amount * UNIT_FACTORS[unit], UNIT_DIMENSIONS[unit])
+        for nutrient, amount, unit in zip(nutrients, amounts, units)
+    }
+
+
+nutrient_resolver = NutrientResolver(fda_daily_values["nutrients"] + LABEL_NUTRIENTS)
+DAILY_VALUES = _daily_values(fda_daily_values["nutrients"])
+
+
+def _label_items(label):
+    for key, value in label.items():
+        # {"per 100g": ..., "per serving": ...}: use the first column
+        if isinstance(value, dict):
+            value = next(iter(value.values()), None)
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else None
+        yield key, None if value is None else str(value)
+
+
+def score_labels(labels):
+    """
+    Score a batch of nutrition label dicts. Returns one row per label entry
+    with columns label (index into ``labels``), key, value, nutrient
+    (None when the key is not a known nutrient), amount, unit, percent_dv
+    and level ("high", "moderate", "low" or None).
+    """
+    frame = pd.DataFrame(
+        [(i, key, value) for i, label in enumerate(labels) for key, value in _label_items(label or {})],
+        columns=["label", "key", "value"],
+    )
+
+    keys = {key: nutrient_resolver.resolve(key) for key in frame["key"].unique()}
+    resolved = frame["key"].map(keys)
+    # Salt: the amount becomes the sodium it contains
+    factor = resolved.map({name: factor for name, (_, factor) in SCORED_AS.items()})
+    frame["nutrient"] = resolved.replace({name: target for name, (target, _) in SCORED_AS.items()})
+    amounts, units = parse_amounts(frame["value"])
+    key_units = frame["key"].str.lower().str.extract(KEY_UNIT_PATTERN)["unit"].map(UNIT_ALIASES)
+    frame["amount"] = amounts.where(factor.isna(), (amounts * factor).round(4))
+    frame["unit"] = units.fillna(key_units)
+
+    reference = frame["nutrient"].map(DAILY_VALUES)
+    daily_value = reference.str[0]
+    comparable = frame["unit"].map(UNIT_DIMENSIONS).eq(reference.str[1])
+    percent = frame["amount"] * frame["unit"].map(UNIT_FACTORS) / daily_value * 100
+    frame["percent_dv"] = percent.where(comparable).round(1)
+
+    frame["level"] = np.select(
+        [frame["percent_dv"] >= HIGH_PERCENT_DV, frame["percent_dv"] <= LOW_PERCENT_DV,
+         frame["percent_dv"].notna()],
+        ["high", "low", "moderate"],
+        default=None,
+    )
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def nutrition_summary(label):
+    """%DV and levels for one extracted "nutritional label" dict"""
+    frame = score_labels([label])
+    matched = frame[frame["nutrient"].notna()]
+    return {
+        "nutrients": matched[["key", "nutrient", "amount", "unit", "percent_dv", "level"]].to_dict("records"),
+        "high": list(dict.fromkeys(matched.loc[matched["level"] == "high", "nutrient"])),
+        "low": list(dict.fromkeys(matched.loc[matched["level"] == "low", "nutrient"])),
+        "unmatched": frame.loc[frame["nutrient"].isna(), "key"].tolist(),
+    }
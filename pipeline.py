@@ -0,0 +1,82 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+# A pipeline step: ``fn(results)`` runs once every stage named in ``deps`` has
+# finished, and receives the dict of results produced so far.
+Stage = namedtuple("Stage", ["name", "fn", "deps"])
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+
+_stage_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+
+class StageError(Exception):
+    def __init__(self, stage, error):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+
+def run_stages(stages, on_stage=None):
+    """
+    Run a small DAG of stages, starting each one as soon as its dependencies
+    are done, so independent stages overlap and the total time approaches
+    the critical path.
+
+    Returns ``(results, timings)``: stage name -> return value, and stage
+    name -> {"start_ms", "duration_ms"} relative to the start of the run,
+    plus "total_ms". The first failing stage cancels the stages that have
+    not started yet and is re-raised as a StageError.
+
+    ``on_stage(name, result)``, if given, is called from the calling thread
+    each time a stage finishes.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stage(s) {missing}")
+
+    started_at = time.perf_counter()
+    results = {}
+    timings = {}
+    running = {}
+    waiting = list(stages)
+
+    def run(stage):
+        start = time.perf_counter()
+        try:
+            with metrics.span(stage.name):
+                return stage.fn(results)
+        finally:
+            timings[stage.name] = {
+                "start_ms": round((start - started_at) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    while waiting or running:
+        ready = [stage for stage in waiting if all(dep in results for dep in stage.deps)]
+        for stage in ready:
+            waiting.remove(stage)
+            running[_stage_executor.submit(run, stage)] = stage
+        if not running:
+            raise ValueError(f"Stages {[stage.name for stage in waiting]} can never run (dependency cycle)")
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            stage = running.pop(future)
+            try:
+                results[stage.name] = future.result()
+            except Exception as e:
+                for pending in running:
+                    pending.cancel()
+                raise StageError(stage.name, e) from e
+            if on_stage is not None:
+                on_stage(stage.name, results[stage.name])
+
+    timings["total_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+    return results, timings
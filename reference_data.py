@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+import pandas as pd
+
+from fda_substances import load_food_substance_index
+from safety_index import build_safety_index
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Table name -> CSV file in DATA_DIR
+REFERENCE_FILES = {
+    "scogs": "FDA--SCOGS.csv",
+    "monographs": "monographs.csv",
+    "roc": "roc15_casrn_index.csv",
+    "fda_substances": "FDA--FoodSubstances.csv",
+}
+
+# Tables that are read through a preprocessed artifact instead of pd.read_csv
+TABLE_LOADERS = {
+    "fda_substances": load_food_substance_index,
+}
+
+
+class ReferenceDataStore:
+    """
+    Process-wide holder for the reference tables in data/.
+
+    Each table is parsed once and shared by every request thread. Before
+    handing out the tables the store compares the files' mtimes with the ones
+    it loaded and re-parses only the files that changed. The returned mapping
+    is read-only and is replaced as a whole on reload, so callers can keep
+    using a snapshot without locking.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, files=REFERENCE_FILES):
+        self.data_dir = data_dir
+        self.files = dict(files)
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._mtimes = {}
+        self._snapshot = None
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, self.files[name])
+
+    def _current_mtimes(self):
+        return {name: os.stat(self._path(name)).st_mtime_ns for name in self.files}
+
+    def _load_table(self, name):
+        logger.info("Loading reference table '%s' from %s", name, self._path(name))
+        loader = TABLE_LOADERS.get(name, pd.read_csv)
+        return loader(self._path(name))
+
+    def _build_snapshot(self, tables):
+        snapshot = dict(tables)
+        snapshot["safety_index"] = build_safety_index(tables)
+        return MappingProxyType(snapshot)
+
+    def get(self):
+        """Return the current read-only tables, loading or reloading as needed"""
+        mtimes = self._current_mtimes()
+        snapshot = self._snapshot
+        if snapshot is not None and mtimes == self._mtimes:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            mtimes = self._current_mtimes()
+            if self._snapshot is not None and mtimes == self._mtimes:
+                return self._snapshot
+
+            tables = dict(self._tables)
+            for name, mtime in mtimes.items():
+                if self._mtimes.get(name) != mtime or name not in tables:
+                    tables[name] = self._load_table(name)
+
+            self._snapshot = self._build_snapshot(tables)
+            self._tables = tables
+            self._mtimes = mtimes
+            return self._snapshot
+
+    def warm(self):
+        """Load every table up front, e.g. before the web app starts serving"""
+        return self.get()
+
+
+# Shared store used by analyze.py and api.py
+reference_store = ReferenceDataStore()
@@ -0,0 +1,468 @@
+"""
+Offline replay harness: the whole analysis pipeline with local stand-ins for
+every external service, for reproducible end-to-end benchmarks.
+
+    python replay.py --target url image api --concurrency 1 4 16 --requests 32
+    python replay.py --latency-scale 0.1 --error-rate 0.05 -o before.json
+
+Only the providers are replaced: the Blinkit page fetch and the browser
+fallback, image downloads, the Gemini stream, the Custom Search call and the
+Mistral call. Each one replays a recorded fixture after a configurable
+latency and fails at a configurable rate. Everything in between (HTML
+parsing, image preparation, the stage executor, search retries and
+coalescing, the LLM concurrency limits, safety and nutrition scoring, the
+prompt builder, Flask) is the real code. Every run starts with empty
+in-memory caches, like a freshly started server: each request is a new
+product (its label images differ), while searches for ingredients an earlier
+request already looked up are served from cache. --warm-cache instead
+replays the same product after one unmeasured request has filled the caches.
+
+The report is JSON: latency percentiles, throughput and per-stage timings
+for every target and concurrency level, so runs can be compared across
+commits. ``--fixtures`` replaces the built-in fixtures with recorded ones
+(keys: product_html, extraction_response, search_results, analysis).
+"""
+import argparse
+import asyncio
+import functools
+import io
+import json
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+
+import metrics
+
+
+@dataclass(frozen=True)
+class ReplayConfig:
+    """Provider latencies in milliseconds and failure rates in [0, 1]"""
+    page_ms: float = 150
+    browser_ms: float = 4000
+    image_ms: float = 120
+    gemini_first_chunk_ms: float = 900
+    gemini_chunk_ms: float = 80
+    search_ms: float = 250
+    analysis_ms: float = 1500
+    jitter: float = 0.2
+    page_error_rate: float = 0.0
+    image_error_rate: float = 0.0
+    gemini_error_rate: float = 0.0
+    search_error_rate: float = 0.0
+    analysis_error_rate: float = 0.0
+    seed: int = 0
+
+    def scaled(self, factor):
+        """The same config with every latency multiplied by ``factor``"""
+        return ReplayConfig(**{
+            key: value * factor if key.endswith("_ms") else value
+            for key, value in asdict(self).items()
+        })
+
+    def with_error_rate(self, rate):
+        return ReplayConfig(**{
+            key: rate if key.endswith("_error_rate") else value
+            for key, value in asdict(self).items()
+        })
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def default_fixtures():
+    """Built-in fixtures: a product page, the prompt's example extraction, search results and an analysis"""
+    from benchmarks import _sample_extraction_response
+
+    extraction_response, document = _sample_extraction_response()
+    product_html = (
+        "<html><head><title>Replay Fruit Cake | Blinkit</title>"
+        '<script type="application/ld+json">'
+        + json.dumps({
+            "@context": "https://schema.org",
+            "@type": "Product",
+            "name": "Replay Fruit Cake",
+            "image": [f"https://cdn.replay.invalid/label-{i}.jpg" for i in range(4)],
+        })
+        + "</script></head><body></body></html>"
+    )
+    analysis = {
+        "nutritional_summary": {
+            "overall_rating": "2",
+            "calories_assessment": "High in calories for its serving size",
+            "macronutrient_balance": "Mostly refined carbohydrate and fat",
+            "key_nutrients": ["Added sugars", "Saturated fat"],
+        },
+        "ingredient_analysis": {
+            "beneficial_ingredients": ["Eggs"],
+            "concerning_ingredients": ["Hydrogenated vegetable oil", "Invert syrup"],
+            "additives_preservatives": ["Preservatives (202 & 282)", "Synthetic food colour (102)"],
+        },
+        "health_considerations": {
+            "overconsumption_risk": "High",
+            "suitable_diets": [],
+            "unsuitable_diets": ["Low-sugar", "Vegan"],
+            "health_warnings": ["Contains wheat and eggs"],
+        },
+        "recommendations": {
+            "consumption_frequency": "Occasional",
+            "portion_guidance": "One slice",
+            "healthier_alternatives": ["Whole-grain fruit bread"],
+        },
+        "detailed_analysis": "Replayed analysis.",
+    }
+    return {
+        "product_html": product_html,
+        "extraction_response": extraction_response,
+        "search_results": {},
+        "analysis": analysis,
+    }
+
+
+def _search_results_for(fixtures, ingredient):
+    recorded = fixtures["search_results"].get(ingredient)
+    if recorded is not None:
+        return recorded
+    return [
+        {
+            "title": f"{ingredient.title()} - health effects ({rank})",
+            "snippet": f"{ingredient.lower()} is a common food ingredient. Source {rank} reviews its safety, "
+                       f"typical use levels and reported health effects.",
+            "link": f"https://source{rank}.replay.invalid/{abs(hash(ingredient)) % 10 ** 8}",
+        }
+        for rank in range(10)
+    ]
+
+
+# ReplayProviders call name -> provider label used by the real call in metrics
+PROVIDER_METRICS = {
+    "page": "blinkit_http",
+    "browser": "blinkit_browser",
+    "image": "image_cdn",
+    "gemini": "gemini",
+    "search": "google_search",
+    "analysis": "mistral",
+}
+
+
+class ReplayProviders:
+    """
+    Context manager that swaps the external calls for fixture replays and
+    restores the originals on exit.
+    """
+
+    def __init__(self, config, fixtures, warm_cache=False):
+        self.config = config
+        self.fixtures = fixtures
+        self.warm_cache = warm_cache
+        self._images_opened = 0
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self._saved = []
+        self.calls = {"page": 0, "browser": 0, "image": 0, "gemini": 0, "search": 0, "analysis": 0}
+
+    def _roll(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _delay(self, ms):
+        jitter = self.config.jitter
+        return ms / 1000 * (1 + jitter * (2 * self._roll() - 1))
+
+    def _call(self, provider, ms, error_rate):
+        with self._rng_lock:
+            self.calls[provider] += 1
+        # Reported like the real call, so /api/metrics looks the same in a replay
+        with metrics.provider_call(PROVIDER_METRICS[provider]):
+            time.sleep(self._delay(ms))
+            if self._roll() < error_rate:
+                raise InjectedFailure(f"Injected {provider} failure")
+
+    def _patch(self, target, name, value):
+        self._saved.append((target, name, target.__dict__.get(name, _MISSING)))
+        setattr(target, name, value)
+
+    def __enter__(self):
+        import analyze
+        import blinkit
+        import googli
+        from benchmarks import _synthetic_carousel
+        from cache import SqliteCache
+        from llm_clients import llm_clients
+
+        config = self.config
+        fixtures = self.fixtures
+        carousel = _synthetic_carousel(count=4)
+        extraction_chunks = [
+            fixtures["extraction_response"][i:i + 250] for i in range(0, len(fixtures["extraction_response"]), 250)
+        ]
+
+        def fetch_product_page(url, timeout=None):
+            self._call("page", config.page_ms, config.page_error_rate)
+            return fixtures["product_html"]
+
+        def extract_image_urls_from_url(url):
+            self._call("browser", config.browser_ms, 0.0)
+            parsed = blinkit.parse_product_page(fixtures["product_html"])
+            return parsed if parsed else (None, [])
+
+        def open_image_from_url(image_url, timeout=None):
+            try:
+                self._call("image", config.image_ms, config.image_error_rate)
+            except InjectedFailure:
+                return None
+            index = int(image_url.rsplit("-", 1)[-1].split(".")[0]) if "-" in image_url else 0
+            image = carousel[index % len(carousel)].copy()
+            if not self.warm_cache:
+                # A different product every time, so extractions are not shared
+                with self._rng_lock:
+                    self._images_opened += 1
+                    _stamp(image, self._images_opened)
+            return image
+
+        def stream_content(contents, model_name=None):
+            with llm_clients.slot("gemini"):
+                self._call("gemini", config.gemini_first_chunk_ms, config.gemini_error_rate)
+                for i, chunk in enumerate(extraction_chunks):
+                    if i:
+                        time.sleep(self._delay(config.gemini_chunk_ms))
+                    yield chunk
+
+        def chat_complete(**kwargs):
+            with llm_clients.slot("mistral"):
+                self._call("analysis", config.analysis_ms, config.analysis_error_rate)
+            content = json.dumps(fixtures["analysis"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        async def fetch_search_results(session, ingredient):
+            with self._rng_lock:
+                self.calls["search"] += 1
+            with metrics.provider_call(PROVIDER_METRICS["search"]):
+                await asyncio.sleep(self._delay(config.search_ms))
+                if self._roll() < config.search_error_rate:
+                    raise googli.RetryableSearchError("Injected search failure")
+            return _search_results_for(fixtures, ingredient)
+
+        # Empty but working caches: what the prefetch writes, the search stage reads
+        ttl = 24 * 3600
+        self._patch(analyze, "product_cache", SqliteCache(":memory:", ttl=ttl, name="products"))
+        self._patch(analyze, "extraction_cache", SqliteCache(":memory:", ttl=ttl, name="extractions"))
+        self._patch(googli, "search_cache", SqliteCache(":memory:", ttl=ttl, name="searches"))
+
+        self._patch(blinkit, "fetch_product_page", fetch_product_page)
+        self._patch(blinkit, "extract_image_urls_from_url", extract_image_urls_from_url)
+        self._patch(blinkit, "open_image_from_url", open_image_from_url)
+        self._patch(googli, "fetch_search_results", fetch_search_results)
+        self._patch(llm_clients, "stream_content", stream_content)
+        self._patch(llm_clients, "chat_complete", chat_complete)
+        return self
+
+    def __exit__(self, *exc_info):
+        for target, name, value in reversed(self._saved):
+            if value is _MISSING:
+                delattr(target, name)
+            else:
+                setattr(target, name, value)
+        self._saved = []
+
+
+_MISSING = object()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def _latency_summary(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "mean": round(statistics.mean(values), 1),
+        "max": round(values[-1], 1),
+    }
+
+
+def _stamp(image, n):
+    """Change one pixel so the image hashes differently for every ``n``"""
+    image.putpixel((0, 0), (n & 0xFF, (n >> 8) & 0xFF, (n >> 16) & 0xFF))
+
+
+@functools.lru_cache(maxsize=1)
+def _label_image():
+    from benchmarks import _synthetic_carousel
+
+    # Built once: the synthetic images carry random noise, so every build differs
+    return _synthetic_carousel(count=2)[1]
+
+
+def _label_png(n=None):
+    image = _label_image().copy()
+    if n is not None:
+        _stamp(image, n)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _request_fn(target, same_product=False):
+    """
+    ``fn(n) -> result dict`` issuing the n-th request against ``target``.
+    Uploaded labels differ per request unless ``same_product`` is set.
+    """
+    if target == "url":
+        from analyze import analyze_product_url
+
+        return lambda n: analyze_product_url(f"https://blinkit.com/prn/replay-product/prid/{n}")
+    if target == "image":
+        from analyze import analyze_product_image
+
+        if same_product:
+            image = _label_png()
+            return lambda n: analyze_product_image(image)
+        return lambda n: analyze_product_image(_label_png(n))
+    if target == "api":
+        from api import app
+
+        client = app.test_client()
+        return lambda n: client.post(
+            "/api/analyze", json={"url": f"https://blinkit.com/prn/replay-product/prid/{n}"}
+        ).get_json()
+    raise ValueError(f"Unknown target '{target}'")
+
+
+def run_benchmark(target, concurrency, requests, same_product=False):
+    """Issue ``requests`` requests against ``target`` with ``concurrency`` in flight"""
+    fn = _request_fn(target, same_product=same_product)
+
+    def timed(n):
+        start = time.perf_counter()
+        try:
+            result = fn(n)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        return (time.perf_counter() - start) * 1000, result
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as executor:
+        outcomes = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started_at
+
+    stages = {}
+    errors = {}
+    for _, result in outcomes:
+        if not result.get("success"):
+            errors[result.get("error")] = errors.get(result.get("error"), 0) + 1
+            continue
+        for stage, timing in (result["data"].get("timings") or {}).items():
+            if isinstance(timing, dict):
+                stages.setdefault(stage, []).append(timing["duration_ms"])
+
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": sum(bool(result.get("success")) for _, result in outcomes),
+        "failed": sum(not result.get("success") for _, result in outcomes),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else None,
+        "latency_ms": _latency_summary([latency for latency, _ in outcomes]),
+        "stages_ms": {stage: _latency_summary(values) for stage, values in sorted(stages.items())},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(targets, concurrency_levels, requests, config, fixtures=None, warm_cache=False):
+    """Run every target at every concurrency level and return the JSON report as a dict"""
+    from reference_data import reference_store
+
+    fixtures = fixtures or default_fixtures()
+    runs = []
+    reference_store.warm()
+    for target in targets:
+        for concurrency in concurrency_levels:
+            # Fresh providers and caches per run, so runs do not warm each other up
+            with ReplayProviders(config, fixtures, warm_cache=warm_cache) as providers:
+                if warm_cache:
+                    # One unmeasured request fills the caches; only the measured ones are counted
+                    _request_fn(target, same_product=True)(requests)
+                    providers.calls = dict.fromkeys(providers.calls, 0)
+                run = run_benchmark(target, concurrency, requests, same_product=warm_cache)
+            run["provider_calls"] = providers.calls
+            runs.append(run)
+            print(f"{target} x{concurrency}: p50 {run['latency_ms'].get('p50')} ms, "
+                  f"{run['throughput_rps']} req/s", file=sys.stderr)
+
+    return {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": asdict(config),
+        "warm_cache": warm_cache,
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the analysis pipeline against local provider stand-ins")
+    parser.add_argument("--target", nargs="+", choices=["url", "image", "api"], default=["url", "image", "api"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per target and concurrency level")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every provider latency")
+    parser.add_argument("--error-rate", type=float, help="failure rate for every provider")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", help="JSON file with recorded fixtures")
+    parser.add_argument("--warm-cache", action="store_true", help="replay one product against caches filled by an unmeasured request")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's log output")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Before importing the pipeline, so api.py does not set up INFO logging first
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR, stream=sys.stderr)
+    config = ReplayConfig(seed=args.seed).scaled(args.latency_scale)
+    if args.error_rate is not None:
+        config = config.with_error_rate(args.error_rate)
+
+    fixtures = default_fixtures()
+    if args.fixtures:
+        with open(args.fixtures, encoding="utf-8") as f:
+            fixtures.update(json.load(f))
+
+    report = run_suite(args.target, args.concurrency, args.requests, config, fixtures,
+                       warm_cache=args.warm_cache)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
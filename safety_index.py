@@ -0,0 +1,195 @@
+import re
+from bisect import bisect_right
+
+# (table, name column, synonym column, CAS column, message builder)
+SAFETY_TABLES = [
+    (
+        "scogs",
+        "GRAS Substance",
+        "Other Names",
+        "CAS Reg. No. or other ID CODE",
+        lambda row: f"FDA SCOGS Status: {row['SCOGS Type of Conclusion']}",
+    ),
+    (
+        "monographs",
+        "Agent",
+        None,
+        "CAS No.",
+        lambda row: f"IARC Classification: Group {row['Group']}",
+    ),
+    (
+        "roc",
+        "NAME OR SYNONYM",
+        None,
+        "CASRN",
+        lambda row: f"Report on Carcinogens Status: {row['Listing in the 15th RoC']}",
+    ),
+]
+
+NO_CLASSIFICATION = "No safety classification found in reference databases"
+
+_WHITESPACE = re.compile(r"\s+")
+_PARENTHETICAL = re.compile(r"\(([^()]*)\)")
+
+
+def normalize_name(name):
+    """Case-fold and collapse whitespace so names can be compared as dictionary keys"""
+    if not isinstance(name, str):
+        return ""
+    return _WHITESPACE.sub(" ", name).strip().casefold()
+
+
+def name_variants(name, synonyms=None):
+    """
+    Yield the normalized keys a record should be findable under: the full
+    name, the name without parentheticals, parenthetical aliases such as
+    "(BHT)" and the ';'-separated entries of a synonyms cell.
+    """
+    full = normalize_name(name)
+    if full:
+        yield full
+        bare = normalize_name(_PARENTHETICAL.sub(" ", full))
+        if bare and bare != full:
+            yield bare
+        for alias in _PARENTHETICAL.findall(full):
+            alias = normalize_name(alias)
+            if alias and not alias.startswith("see "):
+                yield alias
+    if isinstance(synonyms, str):
+        for synonym in synonyms.split(";"):
+            synonym = normalize_name(synonym)
+            if synonym:
+                yield synonym
+
+
+class TableIndex:
+    """
+    Lookup structure for one reference table.
+
+    A query matches the first row (in file order) whose name contains it,
+    which is what the old ``str.contains`` scan returned. Those answers are
+    precomputed for every known name and synonym, so a lookup is a dict
+    probe and only unknown names fall back to a substring search. The
+    search runs ``str.find`` over all names joined into one string and maps
+    the offset back to a row, instead of looping over rows in Python.
+    """
+
+    def __init__(self, df, name_col, synonym_col, cas_col, message):
+        self.names = [normalize_name(name) for name in df[name_col]]
+        self._blob = "\n".join(self.names)
+        self._row_starts = []
+        offset = 0
+        for name in self.names:
+            self._row_starts.append(offset)
+            offset += len(name) + 1
+        self.messages = [message(row) for _, row in df.iterrows()]
+
+        self.cas_index = {}
+        for row_id, cas in enumerate(df[cas_col]):
+            if isinstance(cas, str) and cas.strip():
+                self.cas_index.setdefault(cas.strip(), row_id)
+
+        synonyms = df[synonym_col] if synonym_col else [None] * len(df)
+        self.name_index = {}
+        for row_id, (name, other_names) in enumerate(zip(df[name_col], synonyms)):
+            for key in name_variants(name, other_names):
+                if key in self.name_index:
+                    continue
+                first = self._scan(key, stop=row_id + 1)
+                self.name_index[key] = row_id if first is None else first
+
+    def _scan(self, key, stop=None):
+        if not self.names:
+            return None
+        position = self._blob.find(key)
+        if position < 0:
+            return None
+        row_id = bisect_right(self._row_starts, position) - 1
+        if stop is not None and row_id >= stop:
+            return None
+        return row_id
+
+    def find_name(self, key):
+        """Return the row id for an already-normalized name, or None"""
+        row_id = self.name_index.get(key)
+        if row_id is None:
+            row_id = self._scan(key)
+        return row_id
+
+    def find(self, ingredient_name, cas_number=None):
+        """Return the matching row id, or None"""
+        row_id = self.find_name(normalize_name(ingredient_name))
+
+        if isinstance(cas_number, str):
+            cas_row = self.cas_index.get(cas_number.strip())
+            if cas_row is not None and (row_id is None or cas_row < row_id):
+                row_id = cas_row
+        return row_id
+
+
+class SafetyIndex:
+    """
+    Prebuilt name/synonym/CAS indexes over the SCOGS, IARC and RoC tables,
+    plus the FDA Food Substances index (see fda_substances.py).
+
+    When the caller has no CAS number, the FDA synonym table is used to
+    resolve one so that tables which miss on the name can still match on CAS.
+    """
+
+    def __init__(self, tables):
+        self.tables = [
+            TableIndex(tables[name], name_col, synonym_col, cas_col, message)
+            for name, name_col, synonym_col, cas_col, message in SAFETY_TABLES
+        ]
+        self.food_substances = tables.get("fda_substances")
+
+    def _safety_info(self, substance, row_ids, resolved_cas):
+        safety_info = []
+        for table, row_id in zip(self.tables, row_ids):
+            if row_id is None and resolved_cas:
+                row_id = table.cas_index.get(resolved_cas)
+            if row_id is not None:
+                safety_info.append(table.messages[row_id])
+        if substance is not None:
+            safety_info.append(self.food_substances.message(substance))
+        return safety_info if safety_info else [NO_CLASSIFICATION]
+
+    def _find_substance(self, ingredient_name, cas_number=None):
+        if self.food_substances is None:
+            return None
+        return self.food_substances.find(ingredient_name, cas_number)
+
+    def lookup(self, ingredient_name, cas_number=None):
+        substance = self._find_substance(ingredient_name, cas_number)
+        resolved_cas = cas_number or (substance.cas if substance else None)
+        row_ids = [table.find(ingredient_name, cas_number) for table in self.tables]
+        return self._safety_info(substance, row_ids, resolved_cas)
+
+    def lookup_many(self, ingredients):
+        """
+        Resolve a whole ingredient list at once.
+
+        Each distinct normalized name is resolved once per table, so
+        duplicates and case variants share the work. Returns a dict of
+        ingredient -> safety_info, the same as calling lookup() per item.
+        """
+        keys = {ingredient: normalize_name(ingredient) for ingredient in ingredients}
+        unique_keys = set(keys.values())
+        rows_by_table = [
+            {key: table.find_name(key) for key in unique_keys}
+            for table in self.tables
+        ]
+
+        results = {}
+        for ingredient, key in keys.items():
+            substance = self._find_substance(ingredient)
+            row_ids = [rows[key] for rows in rows_by_table]
+            results[ingredient] = self._safety_info(
+                substance, row_ids, substance.cas if substance else None
+            )
+        return results
+
+
+def build_safety_index(tables):
+    """Build a SafetyIndex from the reference tables returned by the reference store"""
+    return SafetyIndex(tables)
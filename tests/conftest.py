@@ -0,0 +1,15 @@
+import pytest
+
+from replay import ReplayConfig, ReplayProviders, default_fixtures
+
+
+@pytest.fixture
+def replay_fixtures():
+    return default_fixtures()
+
+
+@pytest.fixture
+def replay_providers(replay_fixtures):
+    """Every external service replaced by an instant fixture replay, with empty in-memory caches"""
+    with ReplayProviders(ReplayConfig(jitter=0).scaled(0), replay_fixtures) as providers:
+        yield providers
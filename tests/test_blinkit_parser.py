@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import blinkit
+from blinkit import parse_product_page, scrape_product
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CDN = "https://cdn.grofers.com/app/images/products/sliding_image/"
+CAROUSEL = (
+    "https://cdn.grofers.com/cdn-cgi/image/f=auto,fit=scale-down,q=85,metadata=none,w=480,h=480"
+    "/app/images/products/sliding_image/"
+)
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_carousel_and_name_card():
+    product_name, image_urls = parse_product_page(load("blinkit_carousel.html"))
+
+    assert product_name == "Britannia Fruit Cake"
+    # Carousel order, duplicates and images without src dropped; og:image ignored
+    assert image_urls == [CAROUSEL + "336628a.jpg", CAROUSEL + "336628b.jpg", CAROUSEL + "336628c.jpg"]
+
+
+def test_json_ld_with_type_list_and_graph():
+    product_name, image_urls = parse_product_page(load("blinkit_json_ld.html"))
+
+    assert product_name == "Cadbury Gems Duo Pack Chocolate"
+    assert image_urls == [CDN + "110655a.jpg", CDN + "110655b.jpg", CDN + "110655c.jpg"]
+
+
+def test_json_ld_hero_image_only_falls_back():
+    assert parse_product_page(load("blinkit_json_ld_hero_only.html")) is None
+
+
+def test_open_graph_only_falls_back():
+    assert parse_product_page(load("blinkit_open_graph.html")) is None
+
+
+def test_open_graph_title_names_a_carousel_page():
+    html = load("blinkit_carousel.html").replace("ProductInfoCard__ProductName", "ProductInfoCard__Subtitle")
+
+    product_name, image_urls = parse_product_page(html)
+
+    assert product_name == "Britannia Fruit Cake | Blinkit"
+    assert len(image_urls) == 3
+
+
+def test_page_without_images():
+    assert parse_product_page(load("blinkit_no_images.html")) is None
+
+
+@pytest.mark.parametrize("page, source", [
+    ("blinkit_carousel.html", "http"),
+    ("blinkit_json_ld.html", "http"),
+    ("blinkit_json_ld_hero_only.html", "selenium"),
+    ("blinkit_open_graph.html", "selenium"),
+    ("blinkit_no_images.html", "selenium"),
+])
+def test_scrape_product_falls_back_to_the_browser(monkeypatch, page, source):
+    browser_calls = []
+
+    def extract_image_urls_from_url(url):
+        browser_calls.append(url)
+        return "From browser", [CDN + "browser.jpg"]
+
+    monkeypatch.setattr(blinkit, "SCRAPE_HTTP_FIRST", True)
+    monkeypatch.setattr(blinkit, "fetch_product_page", lambda url: load(page))
+    monkeypatch.setattr(blinkit, "extract_image_urls_from_url", extract_image_urls_from_url)
+
+    scrape = scrape_product("https://blinkit.com/prn/x/prid/1")
+
+    assert scrape.source == source
+    assert len(browser_calls) == (source == "selenium")
+    if source == "selenium":
+        assert scrape.image_urls == [CDN + "browser.jpg"]
@@ -0,0 +1,57 @@
+from io import BytesIO
+
+import PIL.Image
+
+from image_prep import ImagePrepConfig, prepare_image
+
+# EXIF Orientation tag
+ORIENTATION = 0x0112
+
+
+def tagged_jpeg(size, orientation):
+    """A JPEG as a phone stores it: pixels in sensor order plus an orientation tag"""
+    image = PIL.Image.new("RGB", size, "white")
+    # A dark left half, to check the direction of the rotation
+    image.paste((0, 0, 0), (0, 0, size[0] // 2, size[1]))
+    exif = PIL.Image.Exif()
+    exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    return PIL.Image.open(BytesIO(buffer.getvalue()))
+
+
+def decode(blob):
+    return PIL.Image.open(BytesIO(blob["data"]))
+
+
+def test_rotated_jpeg_is_sent_upright():
+    # Orientation 6: displayed rotated 90 degrees clockwise
+    blob = prepare_image(tagged_jpeg((400, 200), 6), ImagePrepConfig())
+
+    image = decode(blob)
+    assert image.size == (200, 400)
+    assert ORIENTATION not in image.getexif()
+    # The stored left half is now on top
+    assert image.convert("L").getpixel((100, 50)) < 64
+    assert image.convert("L").getpixel((100, 350)) > 192
+
+
+def test_upright_jpeg_keeps_its_size():
+    image = decode(prepare_image(tagged_jpeg((400, 200), 1), ImagePrepConfig()))
+
+    assert image.size == (400, 200)
+
+
+def test_long_edge_is_capped_after_rotation():
+    image = decode(prepare_image(tagged_jpeg((2000, 1000), 8), ImagePrepConfig(max_edge=800)))
+
+    assert image.size == (400, 800)
+
+
+def test_transparent_png_is_flattened_on_white():
+    image = PIL.Image.new("RGBA", (10, 10), (255, 0, 0, 0))
+
+    blob = prepare_image(image, ImagePrepConfig())
+
+    assert blob["mime_type"] == "image/jpeg"
+    assert decode(blob).convert("RGB").getpixel((5, 5)) > (240, 240, 240)
@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+from incremental_json import IngredientStreamParser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_stream():
+    with open(os.path.join(FIXTURES, "gemini_extraction_stream.json"), encoding="utf-8") as f:
+        recorded = json.load(f)
+    return recorded["chunks"], recorded["document"]
+
+
+def feed_all(chunks, **kwargs):
+    """(items emitted per chunk, parser) after feeding every chunk"""
+    parser = IngredientStreamParser(**kwargs)
+    return [parser.feed(chunk) for chunk in chunks], parser
+
+
+def test_recorded_chunks():
+    chunks, document = load_stream()
+
+    emitted, parser = feed_all(chunks)
+
+    assert [item for batch in emitted for item in batch] == document["ingredients"]
+    assert parser.ingredients == document["ingredients"]
+    assert parser.complete
+    assert parser.result() == document
+    # Ingredients are handed out while the response is still streaming
+    assert emitted[1] == document["ingredients"][:3]
+    assert not emitted[-1]
+
+
+def test_one_character_chunks():
+    chunks, document = load_stream()
+
+    emitted, parser = feed_all("".join(chunks))
+
+    assert [item for batch in emitted for item in batch] == document["ingredients"]
+    assert parser.result() == document
+
+
+def test_items_are_emitted_when_complete():
+    parser = IngredientStreamParser()
+
+    assert parser.feed('{"ingredients": ["SUG') == []
+    assert parser.feed('AR", "SA') == ["SUGAR"]
+    assert parser.feed('LT"') == ["SALT"]
+    assert parser.feed("]}") == []
+    assert parser.result() == {"ingredients": ["SUGAR", "SALT"]}
+
+
+@pytest.mark.parametrize("split", range(1, 30))
+def test_escaped_quote_split_across_chunks(split):
+    text = r'{"ingredients": ["COCOA \"DUTCH\" PROCESSED", "MILK\\"], "x": "\"]"}'
+
+    emitted, parser = feed_all([text[:split], text[split:]])
+
+    assert [item for batch in emitted for item in batch] == ['COCOA "DUTCH" PROCESSED', "MILK\\"]
+    assert parser.result() == json.loads(text)
+
+
+def test_object_and_number_items():
+    text = (
+        '{"name": {"ingredients": ["nested, not the array"]},'
+        ' "ingredients": [{"name": "SUGAR", "share": [40, "%"]}, 12.5, -3, true, null, [1, [2]], "SALT"],'
+        ' "nutritional label": {"Energy": "450 kcal"}}'
+    )
+
+    emitted, parser = feed_all(text)
+
+    expected = [{"name": "SUGAR", "share": [40, "%"]}, 12.5, -3, True, None, [1, [2]], "SALT"]
+    assert [item for batch in emitted for item in batch] == expected
+    assert parser.result() == json.loads(text)
+
+
+def test_number_item_at_end_of_array():
+    parser = IngredientStreamParser()
+
+    assert parser.feed('{"ingredients": ["A", 42') == ["A"]
+    assert parser.feed("]") == [42]
+
+
+def test_fence_and_surrounding_prose_are_ignored():
+    document = {"ingredients": ["SUGAR", "COCOA {BUTTER}"], "nutritional label": {"Fat": "30 g"}}
+    text = "Sure! Here is the data:\n```json\n" + json.dumps(document, indent=2) + "\n```\nLet me know {if} needed."
+
+    emitted, parser = feed_all([text[i:i + 5] for i in range(0, len(text), 5)])
+
+    assert [item for batch in emitted for item in batch] == document["ingredients"]
+    assert parser.complete
+    assert parser.result() == document
+
+
+def test_other_array_key():
+    emitted, parser = feed_all(['{"ingredients": ["A"], "allergens": ["MILK", ', '"SOY"]}'], array_key="allergens")
+
+    assert [item for batch in emitted for item in batch] == ["MILK", "SOY"]
+
+
+def test_truncated_stream():
+    chunks, document = load_stream()
+    text = "".join(chunks)
+    cut = text.index(json.dumps(document["ingredients"][5])) + 4
+
+    emitted, parser = feed_all([text[:cut]])
+
+    # Only the ingredients that were complete before the cut
+    assert [item for batch in emitted for item in batch] == document["ingredients"][:5]
+    assert not parser.complete
+    with pytest.raises(ValueError):
+        parser.result()
+
+
+def test_no_json_at_all():
+    parser = IngredientStreamParser()
+
+    assert parser.feed("I could not read the label.") == []
+    assert not parser.complete
+    with pytest.raises(ValueError):
+        parser.result()
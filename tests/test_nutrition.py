@@ -0,0 +1,134 @@
+import math
+
+import pytest
+
+from nutrition import nutrition_summary, parse_amounts, score_labels
+
+
+def parsed(value):
+    amounts, units = parse_amounts([value])
+    amount, unit = amounts[0], units[0]
+    return (None if math.isnan(amount) else amount), (None if not isinstance(unit, str) else unit)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("26.5 g", (26.5, "g")),
+    ("405kcal", (405, "kcal")),
+    ("1700 kJ", (1700, "kj")),
+    ("5 grams", (5, "g")),
+    ("12 gms", (12, "g")),
+    ("150 µg", (150, "mcg")),
+    # DFE/NE/RAE suffixes, attached or not
+    ("400mcgDFE", (400, "mcg")),
+    ("400 mcg DFE", (400, "mcg")),
+    ("16mgNE", (16, "mg")),
+    ("900 mcg RAE", (900, "mcg")),
+    # Thousands separators vs decimal commas
+    ("1,234 mg", (1234, "mg")),
+    ("12,500 mg", (12500, "mg")),
+    ("1,234,567 mg", (1234567, "mg")),
+    ("2,5 g", (2.5, "g")),
+    ("0,125 g", (0.125, "g")),
+    ("12,75 g", (12.75, "g")),
+    # Unitless, or not an amount
+    ("30", (30, None)),
+    ("<1 g", (1, "g")),
+    ("1.5x", (None, None)),
+    ("nil", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_amounts(value, expected):
+    assert parsed(value) == expected
+
+
+def nutrient(summary, key):
+    return next(row for row in summary["nutrients"] if row["key"] == key)
+
+
+def test_thousands_separator_is_not_a_decimal_point():
+    summary = nutrition_summary({"Sodium": "1,234 mg"})
+
+    row = nutrient(summary, "Sodium")
+    assert row["amount"] == 1234
+    assert row["percent_dv"] == 53.7
+    assert row["level"] == "high"
+
+
+def test_decimal_comma():
+    row = nutrient(nutrition_summary({"Protein": "2,5 g"}), "Protein")
+
+    assert row["amount"] == 2.5
+    assert row["percent_dv"] == 5.0
+    assert row["level"] == "low"
+
+
+def test_salt_is_scored_as_sodium():
+    row = nutrient(nutrition_summary({"Salt": "1.2 g"}), "Salt")
+
+    assert row["nutrient"] == "Sodium"
+    assert row["amount"] == pytest.approx(0.4716)
+    assert row["unit"] == "g"
+    assert row["percent_dv"] == 20.5
+
+
+def test_total_sugars_are_not_scored_as_added_sugars():
+    summary = nutrition_summary({"of which Sugars": "30 g", "Total Sugars": "30g", "Added Sugars": "10 g"})
+
+    for key in ("of which Sugars", "Total Sugars"):
+        row = nutrient(summary, key)
+        assert row["nutrient"] == "Sugars"
+        assert row["percent_dv"] is None
+        assert row["level"] is None
+    assert nutrient(summary, "Added Sugars")["percent_dv"] == 20.0
+    assert summary["high"] == ["Added sugars"]
+
+
+def test_suffixed_vitamin_amounts():
+    summary = nutrition_summary({"Folate": "400mcgDFE", "Niacin": "16mgNE"})
+
+    assert nutrient(summary, "Folate")["amount"] == 400
+    assert nutrient(summary, "Folate")["unit"] == "mcg"
+    assert nutrient(summary, "Niacin")["amount"] == 16
+    assert nutrient(summary, "Niacin")["unit"] == "mg"
+
+
+def test_unitless_value_takes_the_unit_from_the_key():
+    row = nutrient(nutrition_summary({"Total Fat (g)": "39"}), "Total Fat (g)")
+
+    assert row["nutrient"] == "Fat"
+    assert row["unit"] == "g"
+    assert row["percent_dv"] == 50.0
+
+
+def test_unitless_value_without_a_unit_is_not_scored():
+    row = nutrient(nutrition_summary({"Protein": "5"}), "Protein")
+
+    assert row["amount"] == 5
+    assert row["unit"] is None
+    assert row["percent_dv"] is None
+    assert row["level"] is None
+
+
+def test_energy_in_kilojoules():
+    row = nutrient(nutrition_summary({"Energy": "1674 kJ"}), "Energy")
+
+    assert row["nutrient"] == "Calories"
+    assert row["percent_dv"] == 20.0
+
+
+def test_unmatched_keys_and_nested_columns():
+    summary = nutrition_summary({
+        "Protien": {"per 100g": "5 g", "per serving": "1.5 g"},
+        "Glycemic load": "12",
+    })
+
+    assert nutrient(summary, "Protien")["nutrient"] == "Protein"
+    assert nutrient(summary, "Protien")["amount"] == 5
+    assert summary["unmatched"] == ["Glycemic load"]
+
+
+def test_score_labels_keeps_label_index():
+    frame = score_labels([{"Fat": "10 g"}, {}, {"Sodium": "230 mg"}])
+
+    assert frame["label"].tolist() == [0, 2]
+    assert frame["percent_dv"].tolist() == [12.8, 10.0]
@@ -0,0 +1,69 @@
+from analyze import analyze_product_image, analyze_product_url
+from benchmarks import _sample_extraction_response
+from googli import normalize_ingredient_key
+from replay import _label_png
+
+URL = "https://blinkit.com/prn/replay-product/prid/{}"
+
+
+def ingredient_keys():
+    _, document = _sample_extraction_response()
+    return {normalize_ingredient_key(ingredient) for ingredient in document["ingredients"]}
+
+
+def assert_analyzed(result, fixtures):
+    assert result["success"], result.get("error")
+    assert result["data"]["analysis"] == fixtures["analysis"]
+    assert result["data"]["extracted_data"]["ingredients"]
+
+
+def test_analyze_product_url(replay_providers, replay_fixtures):
+    result = analyze_product_url(URL.format(1))
+
+    assert_analyzed(result, replay_fixtures)
+    assert result["data"]["product_name"] == "Replay Fruit Cake"
+    # The HTTP page is enough; every prefetched search is reused by the search stage
+    assert replay_providers.calls == {
+        "page": 1, "browser": 0, "image": 4, "gemini": 1, "search": len(ingredient_keys()), "analysis": 1,
+    }
+
+
+def test_analyze_product_url_reuses_caches(replay_providers, replay_fixtures):
+    assert_analyzed(analyze_product_url(URL.format(1)), replay_fixtures)
+    assert_analyzed(analyze_product_url(URL.format(1)), replay_fixtures)
+    assert_analyzed(analyze_product_url(URL.format(2)), replay_fixtures)
+
+    calls = replay_providers.calls
+    # The repeat is answered from the product cache; the new product shares no images
+    assert calls["page"] == 2
+    assert calls["gemini"] == 2
+    assert calls["analysis"] == 2
+    assert calls["search"] == len(ingredient_keys())
+
+
+def test_analyze_product_image(replay_providers, replay_fixtures):
+    result = analyze_product_image(_label_png())
+
+    assert_analyzed(result, replay_fixtures)
+    assert replay_providers.calls == {
+        "page": 0, "browser": 0, "image": 0, "gemini": 1, "search": len(ingredient_keys()), "analysis": 1,
+    }
+
+
+def test_api_analyze(replay_providers, replay_fixtures):
+    from api import app
+
+    response = app.test_client().post("/api/analyze", json={"url": URL.format(1)})
+
+    assert response.status_code == 200
+    assert_analyzed(response.get_json(), replay_fixtures)
+    assert replay_providers.calls["search"] == len(ingredient_keys())
+
+
+def test_api_analyze_rejects_missing_url(replay_providers):
+    from api import app
+
+    response = app.test_client().post("/api/analyze", json={})
+
+    assert response.status_code == 400
+    assert not any(replay_providers.calls.values())
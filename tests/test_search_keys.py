@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from googli import normalize_ingredient_key
+
+
+@pytest.mark.parametrize("ingredient, key", [
+    ("SUGAR", "sugar"),
+    ("  Refined   Wheat Flour  ", "refined wheat flour"),
+    ("SUGAR (40%)", "sugar"),
+    ("Cocoa Solids 5.5%", "cocoa solids"),
+    ("ACIDITY REGULATOR (330)", "acidity regulator"),
+    ("COLOUR (E150d)", "colour"),
+    ("ANTIOXIDANT (INS 319)", "antioxidant"),
+    ("EMULSIFIERS (322, 471)", "emulsifiers"),
+    ("EMULSIFIER (471,)", "emulsifier"),
+    ("RAISING AGENTS (500(ii), 503(ii))", "raising agents"),
+    ("PRESERVATIVES (202 & 282)", "preservatives"),
+    ("STABILIZERS (412 and 415)", "stabilizers"),
+    ("COLOURS (150d 102 110)", "colours"),
+    ("COLOURS (E 150d / INS 102)", "colours"),
+    ("STABILIZER (412 & ACIDITY REGULATOR (330))", "stabilizer (412 & acidity regulator )"),
+    # Not codes: too short, or words
+    ("VITAMIN (B12)", "vitamin (b12)"),
+    ("MILK SOLIDS (12)", "milk solids (12)"),
+    # Nothing left but the code: searched as-is
+    ("(330)", "(330)"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize_ingredient_key(ingredient, key):
+    assert normalize_ingredient_key(ingredient) == key
+
+
+def test_same_key_for_spellings_of_one_ingredient():
+    spellings = ["Acidity Regulator (330)", "ACIDITY REGULATOR (E330)", "acidity regulator (INS 330)"]
+
+    assert {normalize_ingredient_key(spelling) for spelling in spellings} == {"acidity regulator"}
+
+
+@pytest.mark.parametrize("codes", [12, 16, 200])
+def test_unclosed_code_list_is_fast(codes):
+    ingredient = "COLOURS (" + " ".join(["150d", "102", "110", "122"] * codes)[: codes * 5]
+
+    start = time.perf_counter()
+    key = normalize_ingredient_key(ingredient)
+
+    assert time.perf_counter() - start < 0.5
+    assert key.startswith("colours (150d")
+
+
+def test_unclosed_list_before_a_closed_one():
+    assert normalize_ingredient_key("COLOURS (150d 102 110, ACID (330)") == "colours (150d 102 110, acid"